@@ -1,22 +1,30 @@
+import argparse
+import json
+import signal
 import time
 import numpy as np
-import threading  # mainly to avoid LCD delays
-from scipy.signal import find_peaks, butter, filtfilt
-from collections import deque
+from acquisition import AcquisitionThread, GripArray, InterruptAcquisition
+import alerts
+from i2c_mux import MuxChannel
+import decision
+import metrics
+import power
+from recording import ReplaySensor, SessionRecorder
 import max30100
 import random
 import sys
+import threading
 import curses
 import locale
+import os
 import lcd_display
 
-from gpiozero import Buzzer
+launch_time = time.perf_counter()  # For the startup report; heavy imports are deferred to init_hardware()
 
 locale.setlocale(locale.LC_ALL, '')
 
 current_speed = 0.0
 target_speed = 45.0
-last_bpm = 0.0
 current_heart_symbol = ""
 last_lcd_text = ""
 last_lcd_color = (0, 0, 0)
@@ -25,23 +33,33 @@ current_imu_x = 0.2
 current_imu_y = 0.2
 target_imu_x = 0.2
 target_imu_y = 0.2
-detection_time = None
 
-# Initialize the MAX30100 sensor
-mx30 = max30100.MAX30100()
-mx30.enable_spo2()  # Use SpO2 mode for both IR and red, but we'll use IR for HR
+# Devices and the estimator are brought up by init_hardware(), not on import
+mx30 = None  # Sensor of the first grip
+sensors = []  # One MAX30100 per grip
+acquisition = None  # Samples the first grip's sensor (or a replay) on its own thread
+grips = None  # GripArray over every grip's acquisition thread
+power_managers = []  # One power.PowerManager per grip, unless started with --no-power-save or --record
+buzzer = None
+alert_manager = None  # alerts.AlertManager driving the buzzer
+hr_estimator = None
+startup_times = {}  # Seconds per init step, filled by init_hardware()
 
 # Parameters
 sampling_rate = 100  # Hz
 window_size = 10 * sampling_rate  # Increased to 10 seconds for more stable calculation
 update_interval = 1  # Update BPM every 1 second
+min_bpm_window = 3.0  # Seconds of signal for a provisional BPM after contact; None waits for the full window
 finger_threshold = 12000  # IR value below this indicates no finger (adjust if needed)
-bpm_history = deque(maxlen=10)  # Increased to 10 for more averaging
-ir_buffer = deque(maxlen=window_size)
-last_update_time = time.time()
-finger_detected_time = None
-was_finger_on = False
-first_heartbeat_detected = False
+frame_store_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lcd_frames")  # Pre-rendered fixed LCD screens
+ui_interval = 0.05  # Seconds between UI/LCD/buzzer refreshes; sampling is not tied to it
+grip_specs = ["1"]  # I2C bus per grip, "BUS" or "BUS:MUX_CHANNEL"
+grip_was_on = np.zeros(1, dtype=bool)  # Per-grip contact on the previous tick
+grip_reset_pending = np.zeros(1, dtype=bool)  # Touched grips still waiting for a full-rate sample
+recorder = None  # SessionRecorder when started with --record
+replay_sensor = None  # ReplaySensor standing in for mx30 when started with --replay
+decision_state = decision.initial_state(time.time())  # Carried between decision.decide() calls
+last_decision = None  # decision.Decision of the latest tick
 last_beat_time = time.time()
 
 # Global scenario flag
@@ -49,21 +67,123 @@ scenario = None
 speed = 0.0
 imu_x = 0.0
 imu_y = 0.0
-drowsiness_status = "No Warning"  # Simulated, since no AI
 
-finger_off_start_time = None
-was_hands_off = False
-
-buzzer = Buzzer(17, active_high=False)  # Use active_high=True if active high
-
-
-# Butterworth bandpass filter
-def bandpass_filter(data, lowcut=0.8, highcut=2.5, fs=sampling_rate, order=5):
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
+was_hands_off_warning = False
+ir_drop_time = None  # perf_counter() time of the IR drop behind a pending hands-off warning
+metrics_exporter = None  # MetricsExporter when started with --metrics-file/--metrics-port
+
+
+def open_grip_buses(specs):
+    # One SMBus per bus number, shared by the mux channels behind it
+    import smbus
+    buses = {}
+    opened = []
+    for spec in specs:
+        bus, _, channel = spec.partition(":")
+        if bus not in buses:
+            buses[bus] = smbus.SMBus(int(bus))
+        opened.append(MuxChannel(buses[bus], int(channel)) if channel else buses[bus])
+    return opened
+
+def init_sensor(replay_path=None, interrupt_gpios=(), power_save=True):
+    global mx30, acquisition, replay_sensor, grips, grip_was_on, grip_reset_pending, power_managers
+    if replay_path:
+        replay_sensor = ReplaySensor(replay_path, realtime=True)
+        sources = [replay_sensor]
+    else:
+        # Initialize one MAX30100 sensor per grip
+        for i2c in open_grip_buses(grip_specs):
+            sensor = max30100.MAX30100(i2c=i2c, sample_rate=sampling_rate)
+            sensor.enable_spo2()  # Use SpO2 mode for both IR and red, but we'll use IR for HR
+            sensors.append(sensor)
+        mx30 = sensors[0]
+        sources = sensors
+    acquisitions = []
+    for g, source in enumerate(sources):
+        if g < len(interrupt_gpios) and replay_sensor is None:
+            acquisitions.append(InterruptAcquisition(source, interrupt_gpios[g]))  # Wake on INT instead of polling
+        else:
+            acquisitions.append(AcquisitionThread(source))
+    acquisition = acquisitions[0]
+    if power_save and replay_sensor is None:
+        power_managers = [power.PowerManager(a) for a in acquisitions]  # Slow idle grips down
+    grips = GripArray(acquisitions)
+    grip_was_on = np.zeros(len(grips), dtype=bool)
+    grip_reset_pending = np.zeros(len(grips), dtype=bool)
+    grips.start()
+
+def init_lcd():
+    lcd_display.init()
+    lcd_display.load_frame_store(frame_store_path)  # Warnings then only cost the SPI write
+    for color in ((0, 255, 0), decision.PROVISIONAL_COLOR):
+        lcd_display.get_atlas(color)  # Live BPM/SpO2 screens are composed from its glyphs
+    lcd_display.show_text("AUMOVIO\n Eng. \n Solutions", (0,255,0))
+    lcd_display.worker.flush()  # Count the first screen as part of startup
+
+def init_buzzer():
+    global buzzer, alert_manager
+    from gpiozero import Buzzer  # Slow import (pin factory probing)
+    buzzer = Buzzer(17, active_high=False)  # Use active_high=True if active high
+    alert_manager = alerts.AlertManager(buzzer)
+
+def init_estimator(bpm_method="beats"):
+    global hr_estimator
+    import heart_rate  # Pulls in scipy.signal
+    import bpm_estimators
+    hr_estimator = heart_rate.BatchHeartRate(len(grip_specs), fs=sampling_rate, num_intervals=10, history_len=window_size,
+                                             estimator=bpm_estimators.create(bpm_method),
+                                             min_window_seconds=min_bpm_window)  # All grips in one pass
+
+def init_hardware(replay_path=None, interrupt_gpios=(), power_save=True, bpm_method="beats"):
+    # Independent devices come up concurrently; per-step times land in startup_times
+    if replay_path:
+        grip_specs[:] = grip_specs[:1]  # A recording holds a single grip
+    steps = {
+        "lcd": init_lcd,
+        "sensor": lambda: init_sensor(replay_path, interrupt_gpios, power_save),
+        "buzzer": init_buzzer,
+        "estimator": lambda: init_estimator(bpm_method),
+    }
+    errors = []
+
+    def timed(name, step):
+        step_start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            errors.append(e)
+        startup_times[name] = time.perf_counter() - step_start
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=timed, args=item, name="init-" + item[0]) for item in steps.items()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    startup_times["total"] = time.perf_counter() - start
+    startup_times["since_launch"] = time.perf_counter() - launch_time
+    if errors:
+        raise errors[0]
+
+def format_startup_times():
+    steps = ", ".join(f"{name} {startup_times[name]:.2f} s" for name in ("lcd", "sensor", "buzzer", "estimator") if name in startup_times)
+    return f"Startup: {steps} (ready in {startup_times['total']:.2f} s, {startup_times['since_launch']:.2f} s since launch)"
+
+def format_power_report():
+    lines = [manager.format_report() for manager in power_managers]
+    if len(lines) > 1:
+        lines = ["Grip %d: %s" % (g + 1, line) for g, line in enumerate(lines)]
+    return "\n".join(lines)
+
+def grip_average(values, contact):
+    # Mean of a per-grip estimate over the grips in contact that have one, else None
+    values = values[contact]
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else None
+
+# Incremental rendering state
+screen_size = None  # (rows, cols) the static frame was last drawn for
+drawn_fields = {}  # Field name -> (row, col, text, attr) currently on screen
 
 # Curses color pairs
 GREEN = 1
@@ -122,50 +242,59 @@ def draw_borders(stdscr, rows, cols):
     except curses.error:
         pass
 
-def update(stdscr):
-    global was_finger_on, finger_detected_time, last_update_time, first_heartbeat_detected, speed, imu_x, imu_y
-    global scenario, speed, imu_x, imu_y, drowsiness_status, last_beat_time
-    global current_speed, target_speed, detection_time, was_hands_off
-    global last_bpm, current_heart_symbol, bpm_display
-    global start_time, finger_off_start_time
-
-    rows, cols = stdscr.getmaxyx()
-    if rows < 20 or cols < 80:
-        stdscr.clear()
-        was_hands_off = False
-        try:
-            stdscr.addstr(0, 0, "Terminal too small (need at least 80x20)")
-        except curses.error:
-            pass
-        stdscr.refresh()
+def draw_field(stdscr, name, row, left, width, text, attr):
+    # Draw text centered in [left, left + width) unless it is already on screen as-is
+    col = left + (width - len(text)) // 2
+    field = (row, col, text, attr)
+    old = drawn_fields.get(name)
+    if old == field:
         return
-
-    ir_value = 0  # Default if read fails
-    read_success = False
-    for attempt in range(5):
-        try:
-            mx30.read_sensor()
-            ir_value = mx30.ir
-            read_success = True
-            break
-        except BlockingIOError:
-            time.sleep(0.001)  # Short delay before retry
-
-    if not read_success:
-        # Handle persistent error, perhaps log or set to hands-off
-        ir_value = finger_threshold - 1  # Simulate no finger if read fails
+    try:
+        if old is not None:
+            stdscr.addstr(old[0], old[1], " " * len(old[2]))  # Erase the previous value
+        stdscr.addstr(row, col, text, attr)
+    except curses.error:
+        pass
+    drawn_fields[name] = field
+
+def tick():
+    """One UI tick without the terminal: samples, decisions, LCD and buzzer.
+
+    Returns the tick's decision.Decision; the simulated/recorded ride inputs
+    are left in speed, imu_x and imu_y.
+    """
+    global speed, imu_x, imu_y, current_speed, target_speed
+    global grip_was_on, grip_reset_pending, decision_state, last_decision
+    global was_hands_off_warning, ir_drop_time, last_lcd_text, last_lcd_color
+
+    # Stage timings: estimator time is recorded by the estimator itself, not as decision
+    logic_start = time.perf_counter()
+    estimator_time = 0.0
+
+    # Samples every grip buffered since the last tick, one column per grip
+    block, valid = grips.take()  # valid: grips whose column holds samples, not zeros
+    samples = block[:, 0]  # First grip; the one recorded with --record
+    latest = acquisition.latest()
+    # A grip whose reads keep failing reads as IR 0, i.e. hands-off
+    contact = grips.latest_ir() >= finger_threshold
+    touched = contact & ~grip_was_on
+    released = grip_was_on & ~contact
+    grip_was_on = contact
+    grip_reset_pending = (grip_reset_pending | touched) & contact
 
     current_time = time.time()
 
     # Update inputs (left side)
     if scenario in [2, 3]:
-        if random.random() < 0.02:
+        # Rates were tuned for a 10 ms tick; scale so the simulation doesn't depend on ui_interval
+        tick_scale = ui_interval / 0.01
+        if random.random() < 0.02 * tick_scale:
             target_speed = random.uniform(20, 70)
         delta = target_speed - current_speed
         if delta > 0:
-            current_speed = min(current_speed + 0.005, target_speed)
+            current_speed = min(current_speed + 0.005 * tick_scale, target_speed)
         elif delta < 0:
-            current_speed = max(current_speed - 0.005, target_speed)
+            current_speed = max(current_speed - 0.005 * tick_scale, target_speed)
         speed = current_speed
     elif scenario == 1:
         elapsed = current_time - start_time
@@ -175,112 +304,107 @@ def update(stdscr):
 
     imu_x = 0.2
     imu_y = 0.2
-    hands_off_detection_enabled = scenario != 1 and speed >= 20
-
-    # Sensor logic
-    if ir_value < finger_threshold:
-        if was_finger_on:
-            was_finger_on = False
-            first_heartbeat_detected = False
-            bpm_history.clear()
-            ir_buffer.clear()
-            last_update_time = current_time
-        bpm_display = "--"
-        if finger_off_start_time is None:
-            finger_off_start_time = current_time
-        if current_time - finger_off_start_time >= 2:
-            last_bpm = 0.0
-            drowsiness_status = "No Value"
-        else:
-            pass  # Keep previous for <2 sec
-        current_heart_symbol = " "
-        measuring_msg = ""
-    else:
-        if not was_finger_on:
-            was_finger_on = True
-            finger_detected_time = current_time
-            finger_off_start_time = None
-        ir_buffer.append(ir_value)
-        if current_time - last_update_time >= update_interval and len(ir_buffer) >= sampling_rate * 10:
-            finger_off_start_time = None
-            ir_array = np.array(ir_buffer, dtype=float)
-            ir_array -= np.mean(ir_array)  # Remove DC component
-            filtered_ir = bandpass_filter(ir_array)
-            peaks, _ = find_peaks(-filtered_ir, height=-np.percentile(filtered_ir, 75), distance=sampling_rate * 0.4, prominence=0.1 * (np.max(filtered_ir) - np.min(filtered_ir)))
-            if len(peaks) > 1:
-                ibis = np.diff(peaks) / sampling_rate
-                if len(ibis) > 0:
-                    avg_ibi = np.mean(ibis)
-                    if avg_ibi > 0:
-                        bpm = 60 / avg_ibi
-                        if 40 < bpm < 200:
-                            bpm_history.append(bpm)
-                    if len(bpm_history) > 0:
-                        avg_bpm = np.mean(bpm_history)
-                        if scenario == 3:
-                            if detection_time is None:
-                                detection_time = current_time
-                            if current_time - detection_time < 5:
-                                last_bpm = 95.0
-                                bpm_display = "95.0"
-                            else:
-                                low_in = 70.0
-                                high_in = 100.0
-                                low_out = 101.0
-                                high_out = 115.0
-                                if avg_bpm <= low_in:
-                                    mapped_bpm = low_out
-                                elif avg_bpm >= high_in:
-                                    mapped_bpm = high_out
-                                else:
-                                    mapped_bpm = low_out + (high_out - low_out) * (avg_bpm - low_in) / (high_in - low_in)
-                                last_bpm = mapped_bpm
-                                bpm_display = f"{mapped_bpm:.1f}"
-                        else:
-                            last_bpm = avg_bpm
-                            bpm_display = f"{avg_bpm:.1f}"
-                        measuring_msg = ""  # Clear measuring after first BPM
-                        if not first_heartbeat_detected:
-                            first_heartbeat_detected = True
-                else:
-                    bpm_display = "--"
-            else:
-                bpm_display = "--"
-
-            last_update_time = current_time
-        else:
-            bpm_display = f"{last_bpm:.1f}" if last_bpm > 0 else "--"
-
-        # For scenario 3, set drowsiness based on BPM
-        if scenario == 3:
-            if bpm_display == "--" or last_bpm == 0:
-                drowsiness_status = "No Value"
-            elif last_bpm <= 100:
-                drowsiness_status = "No Warning"
-            else:
-                drowsiness_status = "Warning"
-        measuring_msg = "Measuring" if not first_heartbeat_detected else ""
+    if replay_sensor is not None and latest is not None:
+        # Ride inputs as recorded rather than simulated
+        speed, imu_x, imu_y = float(latest["speed"]), float(latest["imu_x"]), float(latest["imu_y"])
+    if recorder is not None and len(samples) > 0 and valid[0]:
+        recorder.write(samples, speed, imu_x, imu_y, scenario)
+
+    # Sensor logic: BPM while any grip is held, averaged over the grips in contact
+    bpm = spo2 = None
+    provisional = False
+    if contact.any():
+        for g in np.flatnonzero(touched):
+            hr_estimator.reset(g)  # Fresh contact on this grip
+        # A grip waking from presence mode has no full-rate samples for a tick or two;
+        # its channel is held until the first one with the finger on, and starts there
+        for g in np.flatnonzero(grip_reset_pending & valid):
+            on = np.flatnonzero(block["ir"][:, g] >= finger_threshold)
+            if len(on):
+                # Hold the first reading with the finger on over the ones before it, so the filter starts without a step
+                for field in ("ir", "red"):
+                    block[field][:on[0], g] = block[field][on[0], g]
+                grip_reset_pending[g] = False
+        if len(block) > 0:
+            estimator_start = time.perf_counter()
+            hr_estimator.update(block["t"][:, 0], block["ir"], block["red"], valid & ~grip_reset_pending)  # SpO2 comes from the same pass
+            estimator_time = time.perf_counter() - estimator_start
+        bpm, spo2 = grip_average(hr_estimator.bpm, contact), grip_average(hr_estimator.spo2, contact)
+        provisional = bool((hr_estimator.provisional & contact & ~np.isnan(hr_estimator.bpm)).any())  # Any grip's share of the average
+    decision_state, d = decision.decide(decision_state, current_time, contact, bpm, spo2, speed, scenario, update_interval, provisional)
+    last_decision = d
+
+    if released.any() and d.hands_off_enabled:
+        # Date the alert from the first sample below the threshold on a grip that let go
+        drop_times = []
+        for g in np.flatnonzero(released):
+            below = np.flatnonzero(block["ir"][:, g] < finger_threshold)
+            drop_index = block["index"][below[0], g] if len(below) else grips.next_index[g] - 1
+            drop_times.append(grips.acquisitions[g].sample_time(drop_index) or time.perf_counter())
+        ir_drop_time = min(drop_times)
+
+    # Now LCD logic
+    hands_off_onset = None
+    if d.hands_off_warning and not was_hands_off_warning:
+        hands_off_onset = ir_drop_time
+        ir_drop_time = None
+    was_hands_off_warning = d.hands_off_warning
+
+    if d.lcd_text != last_lcd_text or d.lcd_color != last_lcd_color:
+        lcd_display.show_text(d.lcd_text, d.lcd_color, since=hands_off_onset, stage="hands_off_to_lcd")  # Latest-wins, drawn by the LCD worker thread
+        last_lcd_text = d.lcd_text
+        last_lcd_color = d.lcd_color
+
+    # Buzzer control: the alert manager only touches the buzzer when the sounding alert changes
+    active_alerts = []
+    if d.hands_off_warning:
+        active_alerts.append(alerts.HANDS_OFF.name)
+    if d.drowsiness_warning:
+        active_alerts.append(alerts.HIGH_HEART_RATE.name)
+    alert_manager.update(active_alerts, {alerts.HANDS_OFF.name: hands_off_onset} if hands_off_onset is not None else None)
+
+    # Sensor power follows the grips, after the alerts so a mode switch can't delay them
+    for g, manager in enumerate(power_managers):
+        manager.update(contact[g], d.hands_off_enabled)
+
+    metrics.observe("decision", time.perf_counter() - logic_start - estimator_time)
+    return d
+
+def update(stdscr):
+    global last_beat_time, current_heart_symbol, screen_size
+
+    rows, cols = stdscr.getmaxyx()
+    if rows < 20 or cols < 80:
+        stdscr.clear()
+        screen_size = None
+        try:
+            stdscr.addstr(0, 0, "Terminal too small (need at least 80x20)")
+        except curses.error:
+            pass
+        stdscr.refresh()
+        return
+
+    d = tick()
+    draw_start = time.perf_counter()
+    current_time = time.time()
 
     # Flashing logic
-    if not first_heartbeat_detected:
+    if not decision_state.was_finger_on:
+        current_heart_symbol = " "
+    if not decision_state.first_heartbeat_detected:
         beat_interval = 0.5
     else:
-        beat_interval = 60 / last_bpm if last_bpm > 0 else 1.0
+        beat_interval = 60 / decision_state.last_bpm if decision_state.last_bpm > 0 else 1.0
     if current_time - last_beat_time >= beat_interval:
         current_heart_symbol = "<3 " if current_heart_symbol != "<3 " else " "
         last_beat_time = current_time
 
-    # Unified drowsiness status
-    if bpm_display == "--" or last_bpm == 0.0:
-        drowsiness_status = "No Value"
-    elif scenario == 3 and last_bpm > 100:
-        drowsiness_status = "Warning"
-    else:
-        drowsiness_status = "No Warning"
-
-    # Clear screen and draw borders
-    stdscr.clear()
-    draw_borders(stdscr, rows, cols)
+    # Static frame only when the terminal size changes; fields repaint only on change
+    if (rows, cols) != screen_size:
+        stdscr.clear()
+        draw_borders(stdscr, rows, cols)
+        drawn_fields.clear()
+        screen_size = (rows, cols)
 
     left_width = cols // 2
     right_start = left_width
@@ -291,113 +415,173 @@ def update(stdscr):
     speed_text = f"Vehicle Speed: {speed:.1f} kmph"
     imu_text = f"IMU: X={imu_x:.2f} Y={imu_y:.2f}"
 
-    try:
-        # Ignition
-        col = (left_width - len(ignition_text)) // 2
-        stdscr.addstr(4, col, ignition_text, curses.color_pair(GREEN) | curses.A_BOLD)
-
-        # Speed
-        col = (left_width - len(speed_text)) // 2
-        stdscr.addstr(8, col, speed_text, curses.color_pair(BLUE) | curses.A_BOLD)
-
-        # IMU
-        col = (left_width - len(imu_text)) // 2
-        stdscr.addstr(12, col, imu_text, curses.color_pair(BLUE) | curses.A_BOLD)
-    except curses.error:
-        pass
+    draw_field(stdscr, "ignition", 4, 0, left_width, ignition_text, curses.color_pair(GREEN) | curses.A_BOLD)
+    draw_field(stdscr, "speed", 8, 0, left_width, speed_text, curses.color_pair(BLUE) | curses.A_BOLD)
+    draw_field(stdscr, "imu", 12, 0, left_width, imu_text, curses.color_pair(BLUE) | curses.A_BOLD)
 
     # Right: Outputs
     # Heart Rate
-    bpm_text = f"Live Heart Rate (BPM): {bpm_display}"
-    try:
-        col = right_start + (right_width - len(bpm_text)) // 2
-        stdscr.addstr(4, col, bpm_text, curses.color_pair(RED) | curses.A_BOLD)
-
-        # Heart symbol centered
-        heart_len = len(current_heart_symbol)
-        heart_x = right_start + (right_width - heart_len) // 2
-        stdscr.addstr(8, heart_x, current_heart_symbol, curses.color_pair(RED) | curses.A_BOLD | curses.A_BLINK if first_heartbeat_detected else 0)
-
-        # Measuring
-        meas_len = len(measuring_msg)
-        col = right_start + (right_width - meas_len) // 2
-        stdscr.addstr(10, col, measuring_msg, curses.color_pair(RED) | curses.A_BOLD)
-    except curses.error:
-        pass
+    bpm_text = f"Live Heart Rate (BPM): {d.bpm_display}"
+    draw_field(stdscr, "bpm", 4, right_start, right_width, bpm_text, curses.color_pair(RED) | curses.A_BOLD)
+    draw_field(stdscr, "spo2", 6, right_start, right_width, f"SpO2 (%): {d.spo2_display}", curses.color_pair(RED) | curses.A_BOLD)
+    # Heart symbol centered
+    draw_field(stdscr, "heart", 8, right_start, right_width, current_heart_symbol, curses.color_pair(RED) | curses.A_BOLD | curses.A_BLINK if decision_state.first_heartbeat_detected else 0)
+    draw_field(stdscr, "measuring", 10, right_start, right_width, d.measuring_msg, curses.color_pair(RED) | curses.A_BOLD)
 
     # Hands-off
-    if not hands_off_detection_enabled:
-        hand_status = "Hands-off Warning OFF"
-        hand_color = GRAY
-        if was_hands_off:
-            was_hands_off = False
-    elif ir_value < finger_threshold:
-        hand_status = "Hands OFF"
-        was_hands_off = True
-        hand_color = RED
-    else:
-        hand_status = "Hands ON"
-        if was_hands_off:
-            was_hands_off = False
-        hand_color = GREEN
-    try:
-        col = right_start + (right_width - len(hand_status)) // 2
-        stdscr.addstr(12, col, hand_status, curses.color_pair(hand_color) | curses.A_BOLD)
-    except curses.error:
-        pass
+    hand_color = GRAY if not d.hands_off_enabled else RED if d.hands_off else GREEN
+    draw_field(stdscr, "hands", 12, right_start, right_width, d.hand_status, curses.color_pair(hand_color) | curses.A_BOLD)
 
     # Drowsiness
-    drowsy_text = f"DROWSINESS: {drowsiness_status}"
-    drowsy_color = RED if drowsiness_status == "Warning" else GRAY if drowsiness_status == "No Value" else GREEN
-    try:
-        col = right_start + (right_width - len(drowsy_text)) // 2
-        stdscr.addstr(16, col, drowsy_text, curses.color_pair(drowsy_color) | curses.A_BOLD)
-    except curses.error:
-        pass
+    drowsy_text = f"DROWSINESS: {d.drowsiness_status}"
+    drowsy_color = RED if d.drowsiness_status == "Warning" else GRAY if d.drowsiness_status == "No Value" else GREEN
+    draw_field(stdscr, "drowsiness", 16, right_start, right_width, drowsy_text, curses.color_pair(drowsy_color) | curses.A_BOLD)
 
-    # Now LCD logic
-    is_hands_off_warning = (scenario in [2, 3]) and hand_status == "Hands OFF" and hands_off_detection_enabled
-    is_drowsiness_warning = (scenario == 3) and drowsiness_status == "Warning"
-
-    if is_hands_off_warning:
-        new_text = "HANDS \n OFF"
-        new_color = (255, 0, 0)
-    elif is_drowsiness_warning:
-        new_text = "HIGH \nHeart Rate"
-        new_color = (255, 0, 0)
-    else:
-        if bpm_display == "--":
-            new_text = "Heart Rate\n-- bpm"
-            new_color = (128, 128, 128)
-        else:
-            new_text = f"Heart Rate\n{bpm_display} bpm"
-            new_color = (0, 255, 0)
-
-    global last_lcd_text, last_lcd_color
-    if new_text != last_lcd_text or new_color != last_lcd_color:
-        threading.Thread(target=lcd_display.display_text, args=(new_text, new_color)).start()
-        last_lcd_text = new_text
-        last_lcd_color = new_color
-
-    # Buzzer control
-    if is_hands_off_warning or is_drowsiness_warning:
-        buzzer.beep(on_time=1, off_time=1, n=None, background=True)
-    else:
-        buzzer.off()
-
-    stdscr.refresh()
+    stdscr.noutrefresh()
+    curses.doupdate()
+    metrics.observe("curses_draw", time.perf_counter() - draw_start)
 
 def run_demo(stdscr):
+    global screen_size
     init_curses(stdscr)
+    screen_size = None  # Fresh curses session: draw the static frame again
     while True:
         update(stdscr)
-        time.sleep(0.01)
+        time.sleep(ui_interval)
+
+def start_scenario(choice):
+    global scenario, start_time, current_speed, target_speed, decision_state
+    scenario = choice
+    decision_state = decision_state._replace(was_finger_on=False, first_heartbeat_detected=False,
+                                             detection_time=None, last_bpm=0.0, last_spo2=0.0)
+    hr_estimator.reset()
+    if scenario == 1:
+        start_time = time.time()
+        current_speed = 0.0
+    elif scenario in [2, 3]:
+        current_speed = 18.0
+        target_speed = random.uniform(20, 70)
+
+def shutdown():
+    buzzer.close()
+    grips.stop()
+    if recorder is not None:
+        recorder.close()
+    lcd_display.worker.stop()  # Let the last frame finish drawing
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+
+def status_record(d):
+    # One line of the headless status stream
+    return {
+        "time": round(time.time(), 3),
+        "scenario": scenario,
+        "speed": round(speed, 1),
+        "contact": grip_was_on.tolist(),
+        "bpm": decision_state.last_bpm or None,
+        "spo2": decision_state.last_spo2 or None,
+        "bpm_confidence": round(grip_average(hr_estimator.confidence, grip_was_on) or 0.0, 2),
+        "bpm_provisional": d.bpm_provisional,
+        "hand_status": d.hand_status,
+        "drowsiness": d.drowsiness_status,
+        "hands_off_warning": d.hands_off_warning,
+        "drowsiness_warning": d.drowsiness_warning,
+        "power": [manager.mode for manager in power_managers],
+        "alert": alert_manager.sounding.name if alert_manager.sounding is not None else None,
+    }
+
+def run_headless(duration=None, status=None, status_interval=1.0):
+    """Tick without curses until SIGTERM/SIGINT (or duration seconds).
+
+    With status (a writable text file), a JSON line is written every
+    status_interval seconds and whenever a warning starts or stops.
+    """
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    end = time.perf_counter() + duration if duration is not None else None
+    next_tick = time.perf_counter()
+    next_status = next_tick
+    warnings = None
+    while not stop.is_set():
+        d = tick()
+        now = time.perf_counter()
+        if status is not None and (now >= next_status or (d.hands_off_warning, d.drowsiness_warning) != warnings):
+            status.write(json.dumps(status_record(d)) + "\n")
+            status.flush()
+            next_status = now + status_interval
+            warnings = (d.hands_off_warning, d.drowsiness_warning)
+        if end is not None and now >= end:
+            break
+        # Fixed cadence: a slow tick shortens the next wait instead of delaying every later tick
+        next_tick = max(next_tick + ui_interval, now)
+        stop.wait(next_tick - now)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="2W drowsiness detection demo")
+    parser.add_argument("--record", metavar="PATH", help="record raw sensor samples and scenario inputs to PATH (implies --no-power-save)")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recording in real time instead of reading the sensor")
+    parser.add_argument("--grips", default="1", metavar="SPEC[,SPEC...]", help="one MAX30100 per grip: I2C bus number, or BUS:CHANNEL behind a TCA9548A mux (default: 1)")
+    parser.add_argument("--interrupt-gpio", type=lambda s: [int(g) for g in s.split(",")], metavar="GPIO[,GPIO...]", help="BCM GPIO wired to each grip's MAX30100 INT pin; drain the FIFO on its interrupt instead of polling")
+    parser.add_argument("--metrics-file", metavar="PATH", help="write stage latency histograms (Prometheus text) to PATH")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="serve the histograms at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, metavar="SECONDS", help="how often --metrics-file is rewritten")
+    parser.add_argument("--no-power-save", dest="power_save", action="store_false", help="keep every sensor at full rate even with no hand on the grip")
+    # Choices are bpm_estimators.METHODS, spelled out to keep scipy off the start-up path
+    parser.add_argument("--bpm-method", choices=["beats", "peak", "fft", "autocorr"], default="beats",
+                        help="heart-rate estimator: beat-by-beat average (default), or peak, fft or autocorr over an 8 s window")
+    parser.add_argument("--no-progressive", dest="progressive", action="store_false",
+                        help="show no BPM until the full window is in, instead of a provisional one after min_bpm_window seconds")
+    parser.add_argument("--headless", action="store_true", help="run without the terminal UI or menu (e.g. as a service); needs --scenario")
+    parser.add_argument("--scenario", type=int, choices=[1, 2, 3], help="scenario to run with --headless")
+    parser.add_argument("--status", metavar="PATH", help="with --headless, write JSON-lines status to PATH ('-' for stdout)")
+    parser.add_argument("--status-interval", type=float, default=1.0, metavar="SECONDS", help="seconds between --status lines (default: 1)")
+    parser.add_argument("--duration", type=float, metavar="SECONDS", help="with --headless, stop after SECONDS")
+    args = parser.parse_args(argv)
+    if args.headless and args.scenario is None:
+        parser.error("--headless needs --scenario")
+    return args
+
+def main_headless(args):
+    # Service entry point: no menu, no curses; ends on SIGTERM/SIGINT or --duration
+    start_scenario(args.scenario)
+    status = None
+    if args.status == "-":
+        status = sys.stdout
+    elif args.status:
+        status = open(args.status, "a")
+    try:
+        run_headless(args.duration, status, args.status_interval)
+    finally:
+        lcd_display.show_text("AUMOVIO\n Eng. \n Solutions", (0,255,0))
+        alert_manager.silence()
+        shutdown()
+        if status is not None and status is not sys.stdout:
+            status.close()
+        print(grips.format_stats(), file=sys.stderr)
+        print(alert_manager.format_stats(), file=sys.stderr)
+        if power_managers:
+            print(format_power_report(), file=sys.stderr)
+        print(metrics.registry.summary(), file=sys.stderr)
 
 # Console for user input
-def main():
-    threading.Thread(target=lcd_display.display_text, args=("AUMOVIO\n Eng. \n Solutions", (0,255,0))).start()
-    global scenario
-    global start_time, current_speed, target_speed, detection_time, was_finger_on, first_heartbeat_detected, ir_buffer, bpm_history, last_bpm
+def main(args=None):
+    global recorder, metrics_exporter, min_bpm_window
+    args = args if args is not None else parse_args()
+    if not args.progressive:
+        min_bpm_window = None
+    grip_specs[:] = args.grips.split(",")
+    # Recordings keep every sample at full rate, hands-off periods included, so power save is off
+    init_hardware(args.replay, args.interrupt_gpio or (), args.power_save and not args.record, args.bpm_method)
+    print(format_startup_times(), file=sys.stderr if args.headless else sys.stdout)
+    if args.record:
+        recorder = SessionRecorder(args.record, sample_rate=sampling_rate)
+    if args.metrics_file or args.metrics_port is not None:
+        metrics_exporter = metrics.MetricsExporter(path=args.metrics_file, port=args.metrics_port, interval=args.metrics_interval)
+        metrics_exporter.start()
+    if args.headless:
+        main_headless(args)
+        sys.exit(0)
     while True:
         print("Place your finger on the sensor. Monitoring live...")
         print("\nDemo Scenarios:")
@@ -407,34 +591,28 @@ def main():
         print("q: Quit")
         choice = input("Enter choice (1/2/3/q): ").strip().lower()
         if choice == 'q':
-            buzzer.close()
+            shutdown()
             sys.exit(0)
         elif choice in ['1', '2', '3']:
-            scenario = int(choice)
-            was_finger_on = False
-            first_heartbeat_detected = False
-            detection_time = None
-            last_bpm = 0.0
-            ir_buffer.clear()
-            bpm_history.clear()
-            if scenario == 1:
-                start_time = time.time()
-                current_speed = 0.0
-            elif scenario in [2, 3]:
-                current_speed = 18.0
-                target_speed = random.uniform(20, 70)
+            start_scenario(int(choice))
             print(f"Running Scenario {scenario}. Press Ctrl+C to return to menu.")
             try:
                 curses.wrapper(run_demo)
             except KeyboardInterrupt:
-                threading.Thread(target=lcd_display.display_text, args=("AUMOVIO\n Eng. \n Solutions", (0,255,0))).start()
-                buzzer.off()
+                lcd_display.show_text("AUMOVIO\n Eng. \n Solutions", (0,255,0))
+                alert_manager.silence()
+                print(grips.format_stats())
+                print(alert_manager.format_stats())
+                if power_managers:
+                    print(format_power_report())
+                print(metrics.registry.summary())
                 continue
         else:
             print("Invalid choice. Try again.")
-            threading.Thread(target=lcd_display.display_text, args=("AUMOVIO\n Eng. \n Solutions", (0,255,0))).start()
+            lcd_display.show_text("AUMOVIO\n Eng. \n Solutions", (0,255,0))
 
 if __name__ == "__main__":
     main()
-    threading.Thread(target=lcd_display.display_text, args=("AUMOVIO\n Eng. \n Solutions", (0,255,0))).start()
+    lcd_display.show_text("AUMOVIO\n Eng. \n Solutions", (0,255,0))
+    lcd_display.worker.stop()
     buzzer.close()
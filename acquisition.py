@@ -0,0 +1,353 @@
+"""
+  Real-time MAX30100 acquisition loop, decoupled from the UI.
+
+  The thread drains the sensor FIFO on a fixed schedule (or whenever the sensor
+  raises its INT pin) into the driver's ring buffer; the curses/LCD/buzzer
+  side takes thread-safe copies at its own pace.
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+import max30100
+import metrics
+
+
+class RunningStats(object):
+    """Count, mean, standard deviation and max of a stream, in O(1) memory (Welford)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class AcquisitionThread(object):
+    """Drains the sensor FIFO every poll_interval seconds on its own thread.
+
+    The 16-deep FIFO holds 160 ms at 100 Hz, so polling every 40 ms leaves
+    plenty of slack for scheduling hiccups before any sample is lost.
+    """
+
+    def __init__(self, sensor, poll_interval=0.04, rt_priority=10):
+        self.sensor = sensor
+        self.poll_interval = poll_interval
+        self.rt_priority = rt_priority
+        self.lock = threading.Lock()  # Guards sensor access and its ring buffer
+        self.realtime = False
+        self.read_errors = 0
+        self.last_read_time = None
+        self.period_stats = RunningStats()  # Seconds between polls
+        self.read_stats = RunningStats()  # Seconds spent in one FIFO drain
+        self.low_power = False  # Sensor slowed down by a power.PowerManager
+        self.resume_index = 0  # First sample at full rate after the last low-power spell
+        self._start_time = None
+        self._start_clock = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="max30100-acquisition", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def samples_since(self, index):
+        # Copy of every buffered sample with device index >= index, oldest first
+        with self.lock:
+            window = self.sensor.samples.window()
+            return window[np.searchsorted(window["index"], index):].copy()
+
+    def snapshot(self, n=None):
+        # Copy of the newest n buffered samples
+        with self.lock:
+            return self.sensor.samples.window(n).copy()
+
+    def latest(self):
+        with self.lock:
+            latest = self.sensor.samples.latest()
+            return latest.copy() if latest is not None else None
+
+    def poll(self, almost_full=False):
+        # Drain the FIFO once; the thread calls this on schedule, tools may call it directly
+        start = time.perf_counter()
+        try:
+            with self.lock:
+                if almost_full:
+                    self.sensor.read_fifo(almost_full=True)
+                else:
+                    self.sensor.read_fifo()
+        except OSError:  # Includes BlockingIOError from a busy bus
+            self.read_errors += 1
+            return False
+        self.last_read_time = time.perf_counter()
+        self.read_stats.add(self.last_read_time - start)
+        metrics.observe("sensor_read", self.last_read_time - start)
+        return True
+
+    def sample_time(self, index):
+        # perf_counter() time at which sample index was most likely taken, given
+        # that the newest sample was in the FIFO when the last poll finished
+        if self.last_read_time is None:
+            return None
+        newest = self.sensor.sample_clock - 1
+        return self.last_read_time - (newest - index) / self.sensor.sample_rate
+
+    def set_low_power(self, low_power, poll_interval):
+        # Called by power.PowerManager, with self.lock held, as it reconfigures the sensor
+        self.low_power = low_power
+        self.poll_interval = poll_interval
+        if not low_power:
+            self.resume_index = self.sensor.sample_clock
+
+    def stalled(self, timeout=0.5):
+        # True when no read has succeeded for timeout seconds
+        return self.last_read_time is None or time.perf_counter() - self.last_read_time > timeout
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._start_time if self._start_time else 0.0
+        return {
+            "realtime": self.realtime,
+            "polls": self.period_stats.count,
+            "read_errors": self.read_errors,
+            "dropped_samples": self.sensor.dropped_samples,
+            "i2c_transactions": getattr(self.sensor, "transactions", 0),  # A replay has no bus
+            "period_mean_ms": self.period_stats.mean * 1000,
+            "period_jitter_ms": self.period_stats.std * 1000,
+            "period_max_ms": self.period_stats.max * 1000,
+            "read_mean_ms": self.read_stats.mean * 1000,
+            "read_max_ms": self.read_stats.max * 1000,
+            "effective_rate_hz": (self.sensor.sample_clock - self._start_clock) / elapsed if elapsed else 0.0,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return ("Acquisition: %(polls)d polls, period %(period_mean_ms).1f ms "
+                "(jitter %(period_jitter_ms).2f ms, max %(period_max_ms).1f ms), "
+                "read %(read_mean_ms).2f ms, %(effective_rate_hz).1f Hz, "
+                "%(dropped_samples)d dropped, %(read_errors)d errors, "
+                "%(i2c_transactions)d I2C transactions" % s)
+
+    def _raise_priority(self):
+        # SCHED_FIFO needs root or CAP_SYS_NICE; fall back to normal scheduling
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.rt_priority))
+            self.realtime = True
+        except (AttributeError, OSError):
+            self.realtime = False
+
+    def _run(self):
+        self._raise_priority()
+        self._start_time = time.perf_counter()
+        self._start_clock = self.sensor.sample_clock
+        next_poll = self._start_time
+        last_poll = None
+        while self._running:
+            now = time.perf_counter()
+            if last_poll is not None:
+                self.period_stats.add(now - last_poll)
+            last_poll = now
+            self.poll()
+            next_poll += self.poll_interval
+            delay = next_poll - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll = time.perf_counter()  # Fell behind; don't try to catch up in a burst
+
+
+class GripArray(object):
+    """Several sensors, one per grip, each on its own acquisition thread, read as one.
+
+    take() returns the samples every live grip has delivered since the last
+    call as one (n, grips) FIFO_SAMPLE_DTYPE array, trimmed to a common length
+    so the grips stack column-wise; what a faster grip delivered beyond that
+    waits for the next call. The sensors run at the same nominal rate, so rows
+    line up to within a poll interval. A grip whose acquisition has stalled,
+    or whose sensor a PowerManager has slowed down, is left out and reads as
+    zeros, and the per-grip mask take() returns alongside says which columns
+    hold real samples; when it rejoins, only its samples from after the ramp
+    back to full rate are used.
+    """
+
+    def __init__(self, acquisitions, max_lag=max30100.FIFO_DEPTH):
+        self.acquisitions = list(acquisitions)
+        self.max_lag = max_lag  # Samples a grip may run ahead before its oldest are dropped
+        self.next_index = [0] * len(self.acquisitions)
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.acquisitions)
+
+    def start(self):
+        for acquisition in self.acquisitions:
+            acquisition.start()
+
+    def stop(self, timeout=1.0):
+        for acquisition in self.acquisitions:
+            acquisition.stop(timeout)
+
+    def live(self):
+        return np.array([not a.stalled() for a in self.acquisitions])
+
+    def take(self):
+        live = self.live()
+        live &= [not a.low_power for a in self.acquisitions]
+        blocks = [a.samples_since(max(i, a.resume_index)) if ok else None
+                  for a, i, ok in zip(self.acquisitions, self.next_index, live)]
+        n = min((len(b) for b in blocks if b is not None), default=0)
+        out = np.zeros((n, len(blocks)), dtype=max30100.FIFO_SAMPLE_DTYPE)
+        for g, block in enumerate(blocks):
+            if block is None:
+                continue
+            if len(block) - n > self.max_lag:
+                # Ran far ahead (e.g. another grip was stalled): resynchronize
+                drop = len(block) - n - self.max_lag
+                self.skipped += drop
+                block = block[drop:]
+                self.next_index[g] = int(block["index"][0])
+            if n:
+                for name in max30100.FIFO_SAMPLE_DTYPE.names:  # A replay's records carry extra fields
+                    out[name][:, g] = block[name][:n]
+                self.next_index[g] = int(block["index"][n - 1]) + 1
+        if n and live.any():
+            out["t"] = out["t"][:, [np.argmax(live)]]  # One time base for every column
+        return out, live
+
+    def latest_ir(self):
+        # Newest IR reading per grip; 0 for a grip with a stalled acquisition
+        ir = np.zeros(len(self.acquisitions))
+        for g, acquisition in enumerate(self.acquisitions):
+            latest = acquisition.latest()
+            if latest is not None and not acquisition.stalled():
+                ir[g] = latest["ir"]
+        return ir
+
+    def format_stats(self):
+        lines = ["Grip %d: %s" % (g + 1, a.format_stats()) for g, a in enumerate(self.acquisitions)]
+        if len(lines) == 1:
+            return self.acquisitions[0].format_stats()
+        return "\n".join(lines)
+
+
+class InterruptAcquisition(AcquisitionThread):
+    """Drains the FIFO when the MAX30100 pulls its INT pin low, instead of on a timer.
+
+    With the FIFO-almost-full interrupt the thread wakes once per 15 samples
+    (150 ms at 100 Hz) rather than every poll_interval, and the bus is idle
+    in between. Each wakeup reads INT_STATUS first, which releases the pin so
+    the next edge can't be missed, then drains the FIFO. If no edge arrives
+    within watchdog seconds the FIFO is drained anyway, so a lost edge costs
+    latency rather than stalling acquisition.
+    """
+
+    def __init__(self, sensor, gpio, chip=0, interrupt=max30100.INTERRUPT_FIFO, watchdog=None, rt_priority=10):
+        if interrupt == max30100.INTERRUPT_FIFO:
+            period = (max30100.FIFO_DEPTH - 1) / sensor.sample_rate
+        else:
+            period = 1.0 / sensor.sample_rate  # SpO2/HR ready fire on every sample
+        AcquisitionThread.__init__(self, sensor, poll_interval=period, rt_priority=rt_priority)
+        self.gpio = gpio
+        self.chip = chip
+        self.interrupt = interrupt
+        self.watchdog = watchdog if watchdog is not None else 2 * period
+        self._full_watchdog = self.watchdog
+        self.wakeups = 0
+        self.watchdog_polls = 0
+        self._edge = threading.Event()
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        self._edge.set()
+        AcquisitionThread.stop(self, timeout)
+
+    def set_low_power(self, low_power, poll_interval):
+        # The interrupt paces the reads at full power. At the lower rate A_FULL comes
+        # too seldom (and never during a standby probe), so the watchdog drains the
+        # FIFO every poll_interval instead, which also keeps stalled() false
+        AcquisitionThread.set_low_power(self, low_power, poll_interval)
+        if self.interrupt == max30100.INTERRUPT_FIFO:
+            self.poll_interval = (max30100.FIFO_DEPTH - 1) / self.sensor.sample_rate
+        else:
+            self.poll_interval = 1.0 / self.sensor.sample_rate
+        self.watchdog = min(self._full_watchdog, poll_interval) if low_power else self._full_watchdog
+
+    def _on_edge(self, chip, gpio, level, timestamp):
+        # Runs on the lgpio callback thread: just wake the acquisition thread
+        self._edge.set()
+
+    def stats(self):
+        s = AcquisitionThread.stats(self)
+        s["wakeups"] = self.wakeups
+        s["watchdog_polls"] = self.watchdog_polls
+        return s
+
+    def format_stats(self):
+        s = self.stats()
+        return AcquisitionThread.format_stats(self) + ", %(wakeups)d interrupts, %(watchdog_polls)d watchdog polls" % s
+
+    def _acknowledge(self):
+        # Returns the INT_STATUS bits, or 0 if the read failed
+        try:
+            with self.lock:
+                return self.sensor.get_interrupt_status()
+        except OSError:
+            self.read_errors += 1
+            return 0
+
+    def _run(self):
+        import lgpio
+        handle = lgpio.gpiochip_open(self.chip)
+        lgpio.gpio_claim_alert(handle, self.gpio, lgpio.FALLING_EDGE, lgpio.SET_PULL_UP)  # INT is open-drain, active low
+        callback = lgpio.callback(handle, self.gpio, lgpio.FALLING_EDGE, self._on_edge)
+        try:
+            self._raise_priority()
+            with self.lock:
+                self.sensor.enable_interrupt(self.interrupt)
+            self._start_time = time.perf_counter()
+            self._start_clock = self.sensor.sample_clock
+            self.poll()  # Samples from before the interrupt was enabled
+            last_poll = None
+            while self._running:
+                if self._edge.wait(self.watchdog):
+                    self.wakeups += 1
+                else:
+                    self.watchdog_polls += 1
+                self._edge.clear()
+                if not self._running:
+                    break
+                now = time.perf_counter()
+                if last_poll is not None:
+                    self.period_stats.add(now - last_poll)
+                last_poll = now
+                status = self._acknowledge()
+                self.poll(almost_full=bool(status & max30100.INT_A_FULL))
+        finally:
+            callback.cancel()
+            lgpio.gpio_free(handle, self.gpio)
+            lgpio.gpiochip_close(handle)
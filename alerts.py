@@ -0,0 +1,90 @@
+"""
+  Edge-triggered warnings: which alert the buzzer is sounding, and when.
+
+  DEMO.tick() reports every alert's active/inactive state each tick; the
+  buzzer is only touched when the alert that should be sounding changes, so a
+  beep pattern started by gpiozero runs undisturbed for as long as its alert
+  lasts. The most urgent active alert wins; when it ends, the next one still
+  active takes over with its own pattern.
+"""
+
+import time
+from collections import namedtuple
+
+import metrics
+
+# pattern: gpiozero Buzzer.beep() on_time, off_time (seconds) and n (None = until stopped)
+Alert = namedtuple("Alert", ["name", "priority", "on_time", "off_time", "n"])
+
+# Higher priority wins the buzzer
+HANDS_OFF = Alert("hands_off", priority=20, on_time=1.0, off_time=1.0, n=None)
+HIGH_HEART_RATE = Alert("high_heart_rate", priority=10, on_time=1.0, off_time=1.0, n=None)
+DEFAULT_ALERTS = (HANDS_OFF, HIGH_HEART_RATE)
+
+
+class AlertManager(object):
+    """Drives a gpiozero-style buzzer from per-tick alert states.
+
+    update() takes the set of active alert names and returns the alert now
+    sounding (or None). Onset latency, from the event behind an alert to its
+    pattern starting on the buzzer, is recorded as the "<name>_to_buzzer"
+    stage; without an event time it is measured from the update() that saw
+    the alert come on.
+    """
+
+    def __init__(self, buzzer, alerts=DEFAULT_ALERTS):
+        self.buzzer = buzzer
+        self.alerts = {}
+        self.counts = {}  # Alert name -> times it came on
+        self.active_seconds = {}  # Alert name -> time spent on, over ended occurrences
+        for alert in alerts:
+            self.register(alert)
+        self.active = set()
+        self.sounding = None  # Alert whose pattern the buzzer is playing
+        self.actuations = 0  # beep()/off() calls made
+        self._onsets = {}  # Alert name -> time it came on, until it first sounds
+        self._since = {}  # Alert name -> perf_counter() time it came on
+
+    def register(self, alert):
+        # New alert kinds: anything with a name, priority and beep pattern
+        self.alerts[alert.name] = alert
+        self.counts.setdefault(alert.name, 0)
+        self.active_seconds.setdefault(alert.name, 0.0)
+
+    def update(self, active, events=None):
+        """active: names of the alerts that are on now; events: optional
+        name -> perf_counter() time of the event that raised the alert."""
+        now = time.perf_counter()
+        active = set(active)
+        unknown = active - set(self.alerts)
+        if unknown:
+            raise KeyError("Unknown alert(s): %s" % ", ".join(sorted(unknown)))
+        for name in active - self.active:  # Rising edges
+            self.counts[name] += 1
+            self._since[name] = now
+            self._onsets[name] = (events or {}).get(name) or now
+        for name in self.active - active:  # Falling edges
+            self.active_seconds[name] += now - self._since.pop(name)
+            self._onsets.pop(name, None)
+        self.active = active
+
+        winner = max((self.alerts[name] for name in active), key=lambda a: a.priority, default=None)
+        if winner != self.sounding:
+            if winner is None:
+                self.buzzer.off()
+            else:
+                self.buzzer.beep(on_time=winner.on_time, off_time=winner.off_time, n=winner.n, background=True)
+                onset = self._onsets.pop(winner.name, None)
+                if onset is not None:  # First time this occurrence sounds, not a resume after preemption
+                    metrics.observe(winner.name + "_to_buzzer", time.perf_counter() - onset)
+            self.actuations += 1
+            self.sounding = winner
+        return winner
+
+    def silence(self):
+        # End every alert, e.g. when a scenario stops
+        self.update(())
+
+    def format_stats(self):
+        parts = ["%s %d x, %.1f s" % (name, self.counts[name], self.active_seconds[name]) for name in self.alerts]
+        return "Alerts: %s; %d buzzer actuations" % (", ".join(parts), self.actuations)
@@ -0,0 +1,179 @@
+"""
+  Offline reprocessing of recorded ride sessions (see recording.py).
+
+  Each session is memory-mapped and streamed in fixed-size chunks through the
+  same heart-rate estimator and decision.decide() calls the live demo makes
+  every UI tick, one session per worker process:
+
+      python batch_process.py rides/*.rec --out results [--workers N]
+
+  For every session this writes <name>.timeseries.csv (one row per tick) and
+  <name>.events.jsonl (one line per warning episode), plus summary.json for
+  the whole run.
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import bpm_estimators
+import decision
+import heart_rate
+import recording
+
+TICK_INTERVAL = 0.05  # Seconds per decision tick, as DEMO.ui_interval
+FINGER_THRESHOLD = 12000  # As DEMO.finger_threshold
+UPDATE_INTERVAL = 1.0  # As DEMO.update_interval
+MIN_BPM_WINDOW = 3.0  # As DEMO.min_bpm_window
+
+TIMESERIES_FIELDS = ["t", "speed", "scenario", "ir", "contact", "bpm", "bpm_confidence", "bpm_provisional", "spo2",
+                     "drowsiness_status", "hands_off", "hands_off_warning", "drowsiness_warning"]
+WARNINGS = ("hands_off_warning", "drowsiness_warning")
+
+
+def iter_ticks(records, fs, tick_interval=TICK_INTERVAL, chunk_seconds=60.0):
+    """Yield the records of each tick_interval of recorded time, oldest first.
+
+    Only chunk_seconds of samples are copied out of the memory map at a time;
+    a tick that straddles two chunks is carried over to the next one.
+    """
+    chunk_len = max(1, int(chunk_seconds * fs))
+    if not len(records):
+        return
+    t0 = float(records["t"][0])
+    carry = records[:0]
+    for start in range(0, len(records), chunk_len):
+        chunk = np.concatenate((carry, records[start:start + chunk_len]))
+        tick = ((chunk["t"] - t0) // tick_interval).astype(np.int64)
+        bounds = np.flatnonzero(np.diff(tick)) + 1  # First sample of each new tick
+        last = bounds[-1] if len(bounds) else 0
+        for lo, hi in zip(np.r_[0, bounds[:-1]], bounds):
+            yield chunk[lo:hi]
+        carry = chunk[last:]
+    if len(carry):
+        yield carry
+
+
+def process_session(path, out_dir, chunk_seconds=60.0, tick_interval=TICK_INTERVAL,
+                    finger_threshold=FINGER_THRESHOLD, update_interval=UPDATE_INTERVAL, bpm_method="beats",
+                    min_bpm_window=MIN_BPM_WINDOW):
+    """Run one recorded session through the estimator and decisions; returns a summary dict."""
+    started = time.perf_counter()
+    header, records = recording.load_session(path)
+    fs = header["sample_rate"]
+    name = os.path.splitext(os.path.basename(path))[0]
+    estimator = heart_rate.StreamingHeartRate(fs=fs, history_len=10 * fs, estimator=bpm_estimators.create(bpm_method),
+                                              min_window_seconds=min_bpm_window)
+    state = None
+    was_on = False
+    open_since = dict.fromkeys(WARNINGS)
+    episodes = dict.fromkeys(WARNINGS, 0)
+    warning_seconds = dict.fromkeys(WARNINGS, 0.0)
+    ticks = 0
+    now = 0.0
+
+    with open(os.path.join(out_dir, name + ".timeseries.csv"), "w", newline="") as ts_file, \
+            open(os.path.join(out_dir, name + ".events.jsonl"), "w") as events_file:
+        timeseries = csv.writer(ts_file)
+        timeseries.writerow(TIMESERIES_FIELDS)
+
+        def close_episode(warning, end):
+            start = open_since[warning]
+            events_file.write(json.dumps({"warning": warning, "start": start, "end": end, "duration": end - start}) + "\n")
+            episodes[warning] += 1
+            warning_seconds[warning] += end - start
+            open_since[warning] = None
+
+        for samples in iter_ticks(records, fs, tick_interval, chunk_seconds):
+            now = float(samples["t"][-1])
+            if state is None:
+                state = decision.initial_state(now)
+            ir = int(samples["ir"][-1])
+            contact = ir >= finger_threshold
+            bpm = spo2 = None
+            confidence = 0.0
+            provisional = False
+            if contact:
+                if not was_on:
+                    estimator.reset()
+                    samples = samples[np.argmax(samples["ir"] >= finger_threshold):]  # Start the filter on the finger, not on the step to it
+                estimator.update(samples["t"], samples["ir"], samples["red"])
+                bpm, spo2 = estimator.bpm, estimator.spo2
+                confidence = estimator.confidence
+                provisional = estimator.provisional
+            was_on = contact
+            speed = float(samples["speed"][-1])
+            scenario = int(samples["scenario"][-1]) or None
+            state, d = decision.decide(state, now, (contact,), bpm, spo2, speed, scenario, update_interval, provisional)
+            ticks += 1
+
+            timeseries.writerow([f"{now:.2f}", f"{speed:.1f}", scenario or 0, ir, int(contact),
+                                 f"{state.last_bpm:.1f}", f"{confidence:.2f}", int(d.bpm_provisional), f"{state.last_spo2:.0f}", d.drowsiness_status,
+                                 int(d.hands_off), int(d.hands_off_warning), int(d.drowsiness_warning)])
+            for warning in WARNINGS:
+                active = getattr(d, warning)
+                if active and open_since[warning] is None:
+                    open_since[warning] = now
+                elif not active and open_since[warning] is not None:
+                    close_episode(warning, now)
+
+        for warning in WARNINGS:
+            if open_since[warning] is not None:
+                close_episode(warning, now)  # Still on when the recording ended
+
+    duration = float(records["t"][-1] - records["t"][0]) if len(records) else 0.0
+    summary = {
+        "session": path,
+        "samples": len(records),
+        "duration_s": duration,
+        "ticks": ticks,
+        "processing_s": time.perf_counter() - started,
+    }
+    for warning in WARNINGS:
+        summary[warning + "_episodes"] = episodes[warning]
+        summary[warning + "_s"] = warning_seconds[warning]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocess recorded ride sessions with the demo's BPM, hands-off and drowsiness logic")
+    parser.add_argument("sessions", nargs="+", help="session files written by DEMO.py --record")
+    parser.add_argument("--out", default="batch_output", help="directory for per-session results (default: batch_output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--bpm-method", choices=bpm_estimators.METHODS, default="beats", help="heart-rate estimator (default: beats)")
+    parser.add_argument("--no-progressive", dest="progressive", action="store_false", help="no provisional BPM before the full window, as DEMO.py --no-progressive")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0, help="recorded seconds read from a session at a time")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    # Longest sessions first, so one big file doesn't start last and hold up the run
+    sessions = sorted(args.sessions, key=os.path.getsize, reverse=True)
+    started = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(process_session, path, args.out, args.chunk_seconds, bpm_method=args.bpm_method,
+                               min_bpm_window=MIN_BPM_WINDOW if args.progressive else None): path for path in sessions}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:  # One bad file must not sink the whole run
+                print("%s: failed: %s" % (futures[future], e))
+                continue
+            summaries.append(summary)
+            print("%(session)s: %(duration_s).0f s in %(processing_s).1f s, "
+                  "%(hands_off_warning_episodes)d hands-off, %(drowsiness_warning_episodes)d drowsiness warnings" % summary)
+    elapsed = time.perf_counter() - started
+    recorded = sum(s["duration_s"] for s in summaries)
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump({"sessions": summaries, "wall_s": elapsed, "recorded_s": recorded}, f, indent=2)
+    print("%d sessions, %.0f s of recordings in %.1f s (%.0fx real time)"
+          % (len(summaries), recorded, elapsed, recorded / elapsed if elapsed else 0.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+  Performance benchmarks for the drowsiness-detection pipeline.
+
+  Everything runs on the in-memory fakes from fake_hardware with synthetic PPG
+  from synthetic_ppg, so the numbers can be taken on any machine and compared
+  between commits:
+
+      python benchmark.py [--seconds 60] [--json results.json]
+"""
+
+import fake_hardware
+fake_hardware.install()
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import acquisition
+import bpm_estimators
+import heart_rate
+import lcd_display
+import max30100
+import power
+import synthetic_ppg
+
+FINGER_THRESHOLD = 12000  # Same contact threshold as DEMO.finger_threshold
+
+
+def summarize(durations):
+    # Latency distribution in microseconds
+    us = np.asarray(durations) * 1e6
+    return {
+        "mean_us": float(np.mean(us)),
+        "p50_us": float(np.percentile(us, 50)),
+        "p99_us": float(np.percentile(us, 99)),
+        "max_us": float(np.max(us)),
+    }
+
+
+def bench_demo_update(seconds=60.0, scenario=2, headless=False):
+    """Per-tick latency of DEMO.update() (or of the headless DEMO.tick()) with
+    sensor samples arriving at 100 Hz."""
+    fake_hardware.patch_curses()
+    import DEMO
+    if DEMO.acquisition is None:
+        DEMO.init_hardware()
+    DEMO.acquisition.stop()  # Ticks below drain the FIFO themselves, in lockstep
+    bus = DEMO.mx30.i2c
+    screen = fake_hardware.FakeScreen()
+    DEMO.scenario = scenario
+    DEMO.current_speed = 18.0
+    DEMO.start_time = time.time()
+    per_tick = max(1, int(round(DEMO.ui_interval * DEMO.sampling_rate)))
+    ticks = int(seconds / DEMO.ui_interval)
+    durations = np.empty(ticks)
+    start_actuations = DEMO.alert_manager.actuations
+    for i in range(ticks):
+        bus.advance(per_tick)
+        DEMO.acquisition.poll()
+        start = time.perf_counter()
+        if headless:
+            DEMO.tick()
+        else:
+            DEMO.update(screen)
+        durations[i] = time.perf_counter() - start
+    DEMO.lcd_display.worker.flush(1.0)
+    result = summarize(durations)
+    result["ticks"] = ticks
+    result["addstr_per_tick"] = screen.addstr_calls / ticks
+    result["buzzer_actuations"] = DEMO.alert_manager.actuations - start_actuations
+    return result
+
+
+def bench_replay(seconds=60.0, bpm=75.0):
+    """DEMO.tick() fed from a --replay recording of a synthetic ride: per-tick
+    latency and the BPM error at the end against the recorded pulse."""
+    fake_hardware.patch_curses()
+    import DEMO
+    import recording
+    if DEMO.acquisition is None:
+        DEMO.init_hardware()
+    signal = synthetic_ppg.generate_ppg(seconds, seed=1, bpm=bpm)
+    samples = np.zeros(len(signal), dtype=max30100.FIFO_SAMPLE_DTYPE)
+    samples["index"] = np.arange(len(signal))
+    for field in ("t", "ir", "red"):
+        samples[field] = signal[field]
+    saved = dict((name, getattr(DEMO, name)) for name in
+                 ("acquisition", "grips", "replay_sensor", "power_managers", "hr_estimator",
+                  "grip_was_on", "grip_reset_pending"))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ride.rec")
+        with recording.SessionRecorder(path, DEMO.sampling_rate) as recorder:
+            recorder.write(samples, speed=30.0, scenario=2)
+        per_tick = max(1, int(round(DEMO.ui_interval * DEMO.sampling_rate)))
+        DEMO.replay_sensor = recording.ReplaySensor(path, chunk_len=per_tick)  # Lockstep with the ticks below
+        DEMO.acquisition = acquisition.AcquisitionThread(DEMO.replay_sensor)
+        DEMO.grips = acquisition.GripArray([DEMO.acquisition])
+        DEMO.power_managers = []
+        DEMO.grip_was_on = np.zeros(1, dtype=bool)
+        DEMO.grip_reset_pending = np.zeros(1, dtype=bool)
+        DEMO.init_estimator()
+        DEMO.scenario = 2
+        durations = []
+        try:
+            while not DEMO.replay_sensor.exhausted:
+                DEMO.acquisition.poll()
+                start = time.perf_counter()
+                DEMO.tick()
+                durations.append(time.perf_counter() - start)
+            estimate = DEMO.grip_average(DEMO.hr_estimator.bpm, DEMO.grip_was_on)
+        finally:
+            for name, value in saved.items():
+                setattr(DEMO, name, value)
+    result = summarize(np.array(durations))
+    result["ticks"] = len(durations)
+    result["bpm_error"] = abs(estimate - bpm) if estimate is not None else float("nan")
+    return result
+
+
+def bench_startup():
+    """Time from importing DEMO to the first screen, per device (fake devices
+    still pay the real LCD reset delays)."""
+    import DEMO
+    DEMO.init_hardware()
+    return dict(DEMO.startup_times)
+
+
+def bench_display(frames=50):
+    """Full-frame throughput and cost of a BPM digit change on the LCD, with
+    transfers taking their wire time at the calibrated SPI clock."""
+    lcd_display.init()
+    lcd_display.spi.simulate_wire = True
+    start_bytes, start_seconds = lcd_display.spi_bytes, lcd_display.spi_seconds
+    fps, convert_ms = lcd_display.measure_fps(frames)
+    lcd_display.display_text("Heart Rate\n70.0 bpm", (0, 255, 0))
+    durations = np.empty(frames)
+    sent = 0
+    for i in range(frames):
+        start = time.perf_counter()
+        sent += lcd_display.display_text("Heart Rate\n%.1f bpm" % (70 + i * 0.7), (0, 255, 0))
+        durations[i] = time.perf_counter() - start
+    result = summarize(durations)
+    texts = ["Heart Rate\n%.1f bpm\nSpO2 %d%%" % (60 + i * 0.1, 95 + i % 5) for i in range(frames)]
+    atlas = lcd_display.get_atlas((0, 255, 0))
+    start = time.perf_counter()
+    for text in texts:
+        atlas.compose(text)
+    atlas_us = (time.perf_counter() - start) / frames * 1e6
+    start = time.perf_counter()
+    for text in texts:
+        lcd_display.render_text(text, (0, 255, 0))
+    pil_us = (time.perf_counter() - start) / frames * 1e6
+    result.update({
+        "readout_atlas_us": atlas_us,
+        "readout_pil_us": pil_us,
+        "full_frame_fps": fps,
+        "convert_ms": convert_ms,
+        "bpm_update_bytes": sent / frames,
+        "spi_clock_hz": lcd_display.spi.max_speed_hz,
+        "spi_bytes_per_s": (lcd_display.spi_bytes - start_bytes) / (lcd_display.spi_seconds - start_seconds),
+    })
+    lcd_display.spi.simulate_wire = False
+    return result
+
+
+def bench_read_sensor(samples=4000):
+    """Driver overhead per sample for single reads and for FIFO drains."""
+    bus = fake_hardware.FakeSMBus()
+    sensor = max30100.MAX30100(i2c=bus)
+    start_tx = bus.transactions
+    start = time.perf_counter()
+    for _ in range(samples):
+        bus.advance(1)
+        sensor.read_sensor()
+    single = time.perf_counter() - start
+    single_tx = bus.transactions - start_tx
+
+    # A completely full FIFO reads as empty (write pointer == read pointer), so
+    # drain one short of full, as a timely poll would
+    batch = max30100.FIFO_DEPTH - 1
+    start_tx = bus.transactions
+    start_clock = sensor.sample_clock
+    start = time.perf_counter()
+    for _ in range(samples // batch):
+        bus.advance(batch)
+        sensor.read_fifo()
+    fifo = time.perf_counter() - start
+    fifo_tx = bus.transactions - start_tx
+    drained = sensor.sample_clock - start_clock
+    return {
+        "read_sensor_us_per_sample": single / samples * 1e6,
+        "read_sensor_tx_per_sample": single_tx / samples,
+        "read_fifo_us_per_sample": fifo / drained * 1e6,
+        "read_fifo_tx_per_sample": fifo_tx / drained,
+    }
+
+
+def bench_acquisition_modes(seconds=3.0):
+    """Wakeups and I2C transactions per second, timer polling vs INT-driven,
+    against a sensor producing samples in real time."""
+    results = {}
+    for mode in ("poll", "interrupt"):
+        bus = fake_hardware.FakeSMBus(realtime=True)
+        sensor = max30100.MAX30100(i2c=bus)
+        if mode == "interrupt":
+            fake_hardware.connect_interrupt(bus, 4)
+            thread = acquisition.InterruptAcquisition(sensor, 4)
+        else:
+            thread = acquisition.AcquisitionThread(sensor)
+        thread.start()
+        time.sleep(0.5)  # Skip start-up
+        start_tx, start_polls, start_clock = bus.transactions, thread.period_stats.count, sensor.sample_clock
+        time.sleep(seconds)
+        results[mode + "_wakeups_per_s"] = (thread.period_stats.count - start_polls) / seconds
+        results[mode + "_tx_per_s"] = (bus.transactions - start_tx) / seconds
+        results[mode + "_samples_per_s"] = (sensor.sample_clock - start_clock) / seconds
+        thread.stop()
+        bus.close()
+        results[mode + "_dropped"] = sensor.dropped_samples
+    return results
+
+
+def bench_power_modes(seconds=2.0):
+    """Samples, I2C transactions, polls and LED current per second in each
+    power.PowerManager mode, against a sensor producing samples in real time.
+
+    Each low-power mode is left for FULL again and the first GripArray block
+    checked: resume_low_power_samples counts samples in it without red (i.e.
+    taken at the presence settings) and resume_rate_hz is its length over the
+    wall-clock time it covers, which should be 0 and about 100.
+    """
+    bus = fake_hardware.FakeSMBus(realtime=True)
+    sensor = max30100.MAX30100(i2c=bus)
+    sensor.enable_spo2()
+    thread = acquisition.AcquisitionThread(sensor)
+    manager = power.PowerManager(thread)
+    grips = acquisition.GripArray([thread])
+    thread.start()
+    stale, rates = 0, []
+    # Held grip, hand off at speed, hand back; hand off below the hands-off speed, hand back
+    for contact, hands_off_checked in ((True, True), (False, True), (True, True), (False, False), (True, True)):
+        if contact and manager.mode != power.FULL:
+            grips.take()
+            resumed = time.perf_counter()
+            manager.update(contact, hands_off_checked)
+            time.sleep(0.5)
+            block = grips.take()[0][:, 0]
+            stale += int((block["red"] == 0).sum())
+            rates.append(len(block) / (thread.last_read_time - resumed))
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            manager.update(contact, hands_off_checked)
+            time.sleep(0.05)  # DEMO.ui_interval
+    thread.stop()
+    bus.close()
+    report = manager.report()
+    results = {mode: report[mode] for mode in power.MODES}
+    results["saved"] = {key[len("saved_"):]: value for key, value in report.items() if key.startswith("saved_")}
+    results["resume_low_power_samples"] = stale
+    results["resume_rate_hz"] = float(np.mean(rates))
+    return results
+
+
+ACCURACY_CASES = [
+    {"name": "rest 60", "bpm": 60.0},
+    {"name": "ride 75 noisy", "bpm": 75.0, "noise": 60.0},
+    {"name": "high 100 drifting", "bpm": 100.0, "bpm_drift": 10.0},
+    {"name": "motion 80", "bpm": 80.0, "motion_artifacts": 4},
+    {"name": "grip gaps 70", "bpm": 70.0, "finger_off": [(20, 24), (40, 42)]},
+]
+
+
+def run_estimator(estimator, signal, chunk=4, confidences=None, provisional=None):
+    """Feed signal to estimator as DEMO does (contact samples only, reset on new
+    contact); returns (times, estimates, seconds of CPU). The confidence and
+    provisional flag of each estimate are appended to confidences and
+    provisional, if given."""
+    times, estimates = [], []
+    contact = signal["ir"] >= FINGER_THRESHOLD
+    was_on = False
+    cpu = 0.0
+    for i in range(0, len(signal), chunk):
+        block = signal[i:i + chunk]
+        on = contact[i:i + chunk]
+        start = time.perf_counter()
+        if on.all():
+            if not was_on:
+                estimator.reset()
+            bpm = estimator.update(block["t"], block["ir"], block["red"])
+            if bpm is not None:
+                times.append(block["t"][-1])
+                estimates.append(bpm)
+                if confidences is not None:
+                    confidences.append(estimator.confidence)
+                if provisional is not None:
+                    provisional.append(estimator.provisional)
+        cpu += time.perf_counter() - start
+        was_on = bool(on[-1])
+    return np.asarray(times), np.asarray(estimates), cpu
+
+
+def bench_bpm_accuracy(seconds=60.0):
+    """BPM and SpO2 error against the synthetic ground truth, plus CPU per second of signal."""
+    results = {}
+    for case in ACCURACY_CASES:
+        params = dict(case)
+        name = params.pop("name")
+        signal = synthetic_ppg.generate_ppg(seconds, seed=1, **params)
+        estimator = heart_rate.StreamingHeartRate()
+        times, estimates, cpu = run_estimator(estimator, signal)
+        if len(estimates):
+            truth = np.interp(times, signal["t"], signal["bpm"])
+            mae = float(np.mean(np.abs(estimates - truth)))
+            first = float(times[0])
+        else:
+            mae = first = float("nan")
+        spo2 = estimator.spo2 if estimator.spo2 is not None else float("nan")
+        results[name] = {
+            "mae_bpm": mae,
+            "spo2_error": spo2 - params.get("spo2", 97.0),
+            "estimates": len(estimates),
+            "first_bpm_s": first,
+            "cpu_us_per_s": cpu / seconds * 1e6,
+        }
+    return results
+
+
+def bench_bpm_methods(seconds=60.0, min_window_seconds=None, min_confidence=0.5):
+    """Each bpm_estimators method over the accuracy cases: error, confidence and CPU.
+
+    mae_bpm is averaged over the cases (mae_<case> per case), confidence is
+    the mean reported with the estimates (confidence_<case> per case), and
+    mae_confident / mae_unconfident split the error of every estimate at
+    min_confidence, with confident_share the fraction above it; confidence
+    is useful when the first is low and the second high. cpu_us_per_estimate
+    is the whole pipeline's CPU per BPM refresh. estimate_us times the window
+    estimator alone on one window. With min_window_seconds (progressive
+    windowing), steady_mae_bpm and provisional_mae_bpm split the error
+    between full-window and provisional estimates.
+    """
+    signals = {}
+    for case in ACCURACY_CASES:
+        params = dict(case)
+        name = params.pop("name")
+        signals[name] = synthetic_ppg.generate_ppg(seconds, seed=1, **params)
+    results = {}
+    for method in bpm_estimators.METHODS:
+        row = {}
+        maes, confidences, errors, firsts = [], [], [], []
+        steady, provisional = [], []  # Per-case error of full-window and of provisional estimates
+        estimates = 0
+        cpu = 0.0
+        for name, signal in signals.items():
+            estimator = heart_rate.StreamingHeartRate(estimator=bpm_estimators.create(method), min_window_seconds=min_window_seconds)
+            flags, case_confidences = [], []
+            times, values, case_cpu = run_estimator(estimator, signal, confidences=case_confidences, provisional=flags)
+            mae = float("nan")
+            if len(values):
+                error = np.abs(values - np.interp(times, signal["t"], signal["bpm"]))
+                flags = np.asarray(flags, dtype=bool)
+                mae = float(np.mean(error))
+                errors.extend(error)
+                confidences.extend(case_confidences)
+                firsts.append(float(times[0]))
+                if (~flags).any():
+                    steady.append(float(np.mean(error[~flags])))
+                if flags.any():
+                    provisional.append(float(np.mean(error[flags])))
+            row["mae_" + name.replace(" ", "_")] = mae
+            row["confidence_" + name.replace(" ", "_")] = float(np.mean(case_confidences)) if case_confidences else 0.0
+            maes.append(mae)
+            estimates += len(values)
+            cpu += case_cpu
+        row["mae_bpm"] = float(np.mean(maes))
+        if min_window_seconds is not None:
+            row["steady_mae_bpm"] = float(np.mean(steady)) if steady else float("nan")
+            row["provisional_mae_bpm"] = float(np.mean(provisional)) if provisional else float("nan")
+        row["confidence"] = float(np.mean(confidences)) if confidences else 0.0
+        confident = np.asarray(confidences) >= min_confidence
+        errors = np.asarray(errors)
+        row["mae_confident"] = float(np.mean(errors[confident])) if confident.any() else float("nan")
+        row["mae_unconfident"] = float(np.mean(errors[~confident])) if (~confident).any() else float("nan")
+        row["confident_share"] = float(np.mean(confident)) if len(confident) else 0.0
+        row["first_bpm_s"] = float(np.mean(firsts)) if firsts else float("nan")
+        row["cpu_us_per_s"] = cpu / (seconds * len(signals)) * 1e6
+        row["cpu_us_per_estimate"] = cpu / estimates * 1e6 if estimates else float("nan")
+        window_estimator = bpm_estimators.create(method)
+        if window_estimator is not None:
+            batch = heart_rate.BatchHeartRate()
+            signal = signals[ACCURACY_CASES[0]["name"]]
+            batch.update(signal["t"], signal["ir"], signal["red"])
+            window = batch.history.window(batch.window_len)[:, heart_rate.AC_IR]
+            runs = []
+            for _ in range(50):
+                start = time.perf_counter()
+                window_estimator.estimate(window, batch.fs)
+                runs.append(time.perf_counter() - start)
+            row["estimate_us"] = float(np.median(runs)) * 1e6
+        results[method] = row
+    return results
+
+
+def bench_grip_scaling(seconds=60.0, grip_counts=(1, 2, 4, 8), chunk=5):
+    """CPU per second of signal for BatchHeartRate as grips are added."""
+    signal = synthetic_ppg.generate_ppg(seconds, seed=1)
+    results = {}
+    for grips in grip_counts:
+        estimator = heart_rate.BatchHeartRate(grips)
+        ir = np.repeat(signal["ir"][:, None].astype(float), grips, axis=1)
+        red = np.repeat(signal["red"][:, None].astype(float), grips, axis=1)
+        start = time.perf_counter()
+        for i in range(0, len(signal), chunk):
+            estimator.update(signal["t"][i:i + chunk], ir[i:i + chunk], red[i:i + chunk])
+        results["cpu_us_per_s_%d_grips" % grips] = (time.perf_counter() - start) / seconds * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on fake hardware")
+    parser.add_argument("--seconds", type=float, default=60.0, help="simulated seconds per run")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args()
+
+    results = {
+        "startup": bench_startup(),
+        "read_sensor": bench_read_sensor(),
+        "acquisition": bench_acquisition_modes(),
+        "power": bench_power_modes(),
+        "display": bench_display(),
+        "bpm_accuracy": bench_bpm_accuracy(args.seconds),
+        "bpm_methods": bench_bpm_methods(args.seconds),
+        "bpm_progressive": bench_bpm_methods(args.seconds, min_window_seconds=3.0),  # As DEMO.min_bpm_window
+        "grip_scaling": bench_grip_scaling(args.seconds),
+        "demo_update": bench_demo_update(args.seconds),
+        "headless_tick": bench_demo_update(args.seconds, headless=True),
+        "replay": bench_replay(args.seconds),
+    }
+    for section, values in results.items():
+        print(section)
+        for key, value in values.items():
+            if isinstance(value, dict):
+                print("  %s: %s" % (key, ", ".join("%s=%.4g" % kv for kv in value.items())))
+            else:
+                print("  %s: %.4g" % (key, value))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+  Heart rate from a window of band-passed PPG, three ways.
+
+  Every estimator has the same interface: estimate(window, fs) takes an
+  (n, channels) window of the band-passed IR signal (the AC_IR rows of
+  BatchHeartRate.history) and returns per-channel arrays (bpm, confidence),
+  with bpm NaN where there is no answer and confidence from 0 (a guess) to
+  1 (clean, regular pulse). Pass one to BatchHeartRate(estimator=...) to
+  replace its beat-by-beat average; create() builds one by name.
+"""
+
+import numpy as np
+from scipy.fft import next_fast_len
+from scipy.signal import find_peaks
+
+MIN_BPM = 40.0
+MAX_BPM = 200.0
+MAX_IBI_CV = 0.25  # Inter-beat interval spread (std / mean) at which confidence reaches 0
+MIN_STEADY_RATIO = 0.5  # Quietest / loudest segment RMS below which window confidence drops
+SEGMENT_SECONDS = 1.5  # One beat at MIN_BPM
+
+
+def interval_confidence(ibis):
+    """Confidence in a BPM averaged from inter-beat intervals (seconds).
+
+    The share of intervals in the 40-200 BPM range, scaled down as their
+    spread approaches MAX_IBI_CV; 0 with fewer than two plausible intervals.
+    """
+    ibis = np.asarray(ibis, dtype=float)
+    plausible = ibis[(ibis > 60 / MAX_BPM) & (ibis < 60 / MIN_BPM)]
+    if len(plausible) < 2:
+        return 0.0
+    cv = plausible.std() / plausible.mean()
+    return float(len(plausible) / len(ibis) * max(0.0, 1.0 - cv / MAX_IBI_CV))
+
+
+def steadiness(window, fs):
+    """Per-channel factor from 0 to 1 for how evenly a window's power is spread in time.
+
+    The window is cut into SEGMENT_SECONDS segments and the RMS of the
+    quietest compared with the loudest: a pulse keeps it near 1, a motion
+    burst, which a spectrum or autocorrelation can take for a clean rhythm,
+    pushes it towards 0. Ratios of MIN_STEADY_RATIO and up count as steady.
+    """
+    n, c = window.shape
+    seg = int(SEGMENT_SECONDS * fs)
+    k = n // seg
+    if k < 2:
+        return np.ones(c)
+    x = window[n - k * seg:] - window.mean(axis=0)
+    rms = np.sqrt((x.reshape(k, seg, c) ** 2).mean(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(rms.max(axis=0) > 0, rms.min(axis=0) / rms.max(axis=0), 0.0)
+    return np.clip(ratio / MIN_STEADY_RATIO, 0.0, 1.0)
+
+
+def _parabolic(y, k):
+    # Sub-sample offset of the maxima at rows k (one per column) from a parabola through their neighbours
+    cols = np.arange(y.shape[1])
+    inner = (k > 0) & (k < len(y) - 1)
+    k = np.clip(k, 1, len(y) - 2)
+    a, b, c = y[k - 1, cols], y[k, cols], y[k + 1, cols]
+    denom = a - 2 * b + c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where(inner & (denom < 0), 0.5 * (a - c) / denom, 0.0)
+    return np.clip(delta, -0.5, 0.5)
+
+
+class PeakEstimator(object):
+    """Mean inter-beat interval between the troughs of the window.
+
+    Troughs are found with scipy find_peaks, min_beat_interval seconds apart
+    and at least threshold_ratio of the window's largest swing deep;
+    confidence is interval_confidence() of the intervals between them
+    times steadiness().
+    """
+
+    name = "peak"
+
+    def __init__(self, min_beat_interval=0.4, threshold_ratio=0.3):
+        self.min_beat_interval = min_beat_interval
+        self.threshold_ratio = threshold_ratio
+
+    def estimate(self, window, fs):
+        n, c = window.shape
+        bpm = np.full(c, np.nan)
+        confidence = np.zeros(c)
+        distance = max(1, int(self.min_beat_interval * fs))
+        steady = steadiness(window, fs)
+        for ch in range(c):
+            sig = -window[:, ch]  # Troughs of the IR PPG mark the beats
+            troughs, _ = find_peaks(sig, distance=distance, height=self.threshold_ratio * np.abs(sig).max())
+            ibis = np.diff(troughs) / fs
+            plausible = ibis[(ibis > 60 / MAX_BPM) & (ibis < 60 / MIN_BPM)]
+            if len(plausible) >= 2:
+                bpm[ch] = 60 / plausible.mean()
+                confidence[ch] = interval_confidence(ibis) * steady[ch]
+        return bpm, confidence
+
+
+class SpectralEstimator(object):
+    """Strongest frequency of the Hann-windowed spectrum in the 40-200 BPM band.
+
+    One rfft over all channels, zero-padded to about resolution BPM per bin
+    and refined by parabolic interpolation. The peak is picked on the
+    harmonic sum P(f) + P(2f) of the spectral peaks, which keeps it on the
+    fundamental. Confidence is the share of the in-band power inside the
+    main lobes of the peak and its harmonics, so noise spread over the band
+    lowers it, times steadiness() for bursts that concentrate it.
+    """
+
+    name = "fft"
+
+    def __init__(self, resolution=0.5):
+        self.resolution = resolution  # BPM per bin after zero-padding
+
+    def estimate(self, window, fs):
+        n, c = window.shape
+        x = (window - window.mean(axis=0)) * np.hanning(n)[:, None]
+        nfft = next_fast_len(max(n, int(np.ceil(60.0 * fs / self.resolution))))
+        power = np.abs(np.fft.rfft(x, nfft, axis=0)) ** 2
+        freqs = np.fft.rfftfreq(nfft, 1.0 / fs) * 60.0  # BPM
+        lo, hi = np.searchsorted(freqs, [MIN_BPM, MAX_BPM])
+        band = power[lo:hi]
+        # Score spectral peaks with their second harmonic too, so a strong dicrotic harmonic isn't taken
+        # for the pulse; bins off a peak (e.g. a short window's lobe tail) get no such credit
+        peak = (band >= power[lo - 1:hi - 1]) & (band >= power[lo + 1:hi + 1])
+        k = (band + np.where(peak, power[2 * lo:2 * hi:2], 0.0)).argmax(axis=0)
+        bpm = freqs[lo + k] + _parabolic(band, k) * freqs[1]
+        lobe = 2 * 60.0 * fs / n  # Hann main lobe half-width, BPM
+        total = band.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            harmonic = np.maximum(np.round(freqs[lo:hi, None] / bpm), 1)  # Nearest k in k * bpm
+            in_lobe = (band * (np.abs(freqs[lo:hi, None] - harmonic * bpm) <= lobe)).sum(axis=0)
+            confidence = np.where(total > 0, in_lobe / total, 0.0) * steadiness(window, fs)
+        bpm[total <= 0] = np.nan
+        return bpm, confidence
+
+
+class AutocorrelationEstimator(object):
+    """Lag of the strongest self-similarity between 40 and 200 BPM.
+
+    The autocorrelation of all channels comes from one zero-padded
+    rfft/irfft pair. The biased estimate is searched, which favours the
+    shortest period over its multiples; confidence is the correlation at
+    that lag (unbiased, clipped to 0-1) times steadiness(), since a motion
+    burst correlates with itself as well as a pulse does.
+    """
+
+    name = "autocorr"
+
+    def estimate(self, window, fs):
+        n, c = window.shape
+        x = window - window.mean(axis=0)
+        nfft = next_fast_len(2 * n)
+        spectrum = np.fft.rfft(x, nfft, axis=0)
+        ac = np.fft.irfft(np.abs(spectrum) ** 2, nfft, axis=0)[:n]
+        lo = max(1, int(60.0 * fs / MAX_BPM))
+        hi = min(n - 2, int(np.ceil(60.0 * fs / MIN_BPM)))
+        bpm = np.full(c, np.nan)
+        confidence = np.zeros(c)
+        energy = ac[0]
+        if hi <= lo:
+            return bpm, confidence  # Window shorter than the slowest period
+        seg = ac[lo:hi + 1]
+        k = seg.argmax(axis=0)
+        lag = lo + k + _parabolic(seg, k)
+        cols = np.arange(c)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = seg[k, cols] / energy * n / (n - (lo + k))
+        ok = (energy > 0) & (seg[k, cols] > 0)
+        bpm[ok] = 60.0 * fs / lag[ok]
+        confidence[ok] = np.clip(r[ok], 0.0, 1.0) * steadiness(window, fs)[ok]
+        return bpm, confidence
+
+
+ESTIMATORS = {cls.name: cls for cls in (PeakEstimator, SpectralEstimator, AutocorrelationEstimator)}
+# "beats" is BatchHeartRate's own beat-by-beat average, which needs no window estimator
+METHODS = ("beats",) + tuple(ESTIMATORS)
+
+
+def create(method, **kwargs):
+    """Estimator for one of METHODS; None for "beats"."""
+    if method == "beats":
+        return None
+    if method not in ESTIMATORS:
+        raise ValueError("Unknown BPM method %r (expected one of %s)" % (method, ", ".join(METHODS)))
+    return ESTIMATORS[method](**kwargs)
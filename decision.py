@@ -0,0 +1,156 @@
+"""
+  Per-tick BPM display, hands-off and drowsiness decisions, as a pure function.
+
+  decide() holds the rules DEMO.update() applies every UI tick, with the state
+  carried between ticks passed in and returned explicitly, so the live demo,
+  the headless service and offline batch processing of recorded sessions all
+  make exactly the same calls.
+"""
+
+from collections import namedtuple
+
+FINGER_OFF_HOLD = 2.0  # Seconds the last BPM/SpO2 stay up after the finger leaves
+HANDS_OFF_MIN_SPEED = 20.0  # kmph; below this hands-off is not checked
+SCENARIO3_WARMUP = 5.0  # Seconds scenario 3 shows a fixed 95 bpm before mapping
+PROVISIONAL_COLOR = (255, 191, 0)  # LCD readout while the BPM comes from a short window
+
+# Everything decide() needs to remember from one tick to the next
+DecisionState = namedtuple("DecisionState", [
+    "was_finger_on",
+    "first_heartbeat_detected",
+    "finger_off_start_time",
+    "last_update_time",
+    "detection_time",
+    "last_bpm",
+    "last_spo2",
+    "bpm_provisional",  # last_bpm came from less than the full window
+])
+
+# What to show and sound after one tick
+Decision = namedtuple("Decision", [
+    "bpm_display",  # "--" or BPM with one decimal
+    "bpm_provisional",
+    "spo2_display",  # "--" or SpO2 percent
+    "measuring_msg",
+    "drowsiness_status",  # "No Value", "No Warning" or "Warning"
+    "hands_off_enabled",
+    "hands_off",  # Some grip is not held (only when hands_off_enabled)
+    "hand_status",
+    "hands_off_warning",
+    "drowsiness_warning",
+    "lcd_text",
+    "lcd_color",
+])
+
+
+def initial_state(now):
+    return DecisionState(
+        was_finger_on=False,
+        first_heartbeat_detected=False,
+        finger_off_start_time=None,
+        last_update_time=now,
+        detection_time=None,
+        last_bpm=0.0,
+        last_spo2=0.0,
+        bpm_provisional=False,
+    )
+
+
+def map_scenario3_bpm(bpm):
+    # Scenario 3 demonstrates the warning: 70-100 bpm is shown as 101-115 bpm
+    low_in, high_in = 70.0, 100.0
+    low_out, high_out = 101.0, 115.0
+    if bpm <= low_in:
+        return low_out
+    if bpm >= high_in:
+        return high_out
+    return low_out + (high_out - low_out) * (bpm - low_in) / (high_in - low_in)
+
+
+def decide(state, now, contact, bpm, spo2, speed, scenario, update_interval=1.0, provisional=False):
+    """One tick of decisions.
+
+    contact: per-grip finger contact (a sequence of bools); bpm, spo2: the
+    estimator's current values over the grips in contact, or None;
+    provisional: bpm is from a short window; now: the tick time in seconds.
+    Returns (new_state, Decision); state is never modified in place.
+    """
+    s = state
+    hands_off_enabled = scenario != 1 and speed >= HANDS_OFF_MIN_SPEED
+    any_contact = any(contact)
+
+    if not any_contact:
+        if s.was_finger_on:
+            s = s._replace(was_finger_on=False, first_heartbeat_detected=False, last_update_time=now)
+        bpm_display = "--"
+        if s.finger_off_start_time is None:
+            s = s._replace(finger_off_start_time=now)
+        if now - s.finger_off_start_time >= FINGER_OFF_HOLD:
+            s = s._replace(last_bpm=0.0, last_spo2=0.0, bpm_provisional=False)
+        measuring_msg = ""
+    else:
+        if not s.was_finger_on:
+            s = s._replace(was_finger_on=True, finger_off_start_time=None)
+        if now - s.last_update_time >= update_interval and bpm is not None:
+            s = s._replace(finger_off_start_time=None, last_spo2=spo2 or 0.0, bpm_provisional=provisional)
+            if scenario == 3:
+                if s.detection_time is None:
+                    s = s._replace(detection_time=now)
+                if now - s.detection_time < SCENARIO3_WARMUP:
+                    s = s._replace(last_bpm=95.0)
+                else:
+                    s = s._replace(last_bpm=map_scenario3_bpm(bpm))
+            else:
+                s = s._replace(last_bpm=bpm)
+            bpm_display = f"{s.last_bpm:.1f}"
+            s = s._replace(first_heartbeat_detected=True, last_update_time=now)
+        else:
+            bpm_display = f"{s.last_bpm:.1f}" if s.last_bpm > 0 else "--"
+        measuring_msg = "Measuring" if not s.first_heartbeat_detected else "Provisional" if s.bpm_provisional else ""
+
+    if bpm_display == "--" or s.last_bpm == 0.0:
+        drowsiness_status = "No Value"
+    elif scenario == 3 and s.last_bpm > 100:
+        drowsiness_status = "Warning"
+    else:
+        drowsiness_status = "No Warning"
+    spo2_display = f"{s.last_spo2:.0f}" if s.last_spo2 > 0 and bpm_display != "--" else "--"
+
+    # Hands-off: every grip must be held
+    hands_off = False
+    if not hands_off_enabled:
+        hand_status = "Hands-off Warning OFF"
+    elif not all(contact):
+        hand_status = "Hands OFF"
+        if len(contact) > 1:
+            hand_status += " (grip %s)" % ", ".join(str(g + 1) for g, held in enumerate(contact) if not held)
+        hands_off = True
+    else:
+        hand_status = "Hands ON"
+
+    hands_off_warning = scenario in (2, 3) and hands_off
+    drowsiness_warning = scenario == 3 and drowsiness_status == "Warning"
+    if hands_off_warning:
+        lcd_text, lcd_color = "HANDS \n OFF", (255, 0, 0)
+    elif drowsiness_warning:
+        lcd_text, lcd_color = "HIGH \nHeart Rate", (255, 0, 0)
+    elif bpm_display == "--":
+        lcd_text, lcd_color = "Heart Rate\n-- bpm", (128, 128, 128)
+    else:
+        lcd_text = f"Heart Rate\n{bpm_display} bpm\nSpO2 {spo2_display}%"
+        lcd_color = PROVISIONAL_COLOR if s.bpm_provisional else (0, 255, 0)
+
+    return s, Decision(
+        bpm_display=bpm_display,
+        bpm_provisional=s.bpm_provisional and bpm_display != "--",
+        spo2_display=spo2_display,
+        measuring_msg=measuring_msg,
+        drowsiness_status=drowsiness_status,
+        hands_off_enabled=hands_off_enabled,
+        hands_off=hands_off,
+        hand_status=hand_status,
+        hands_off_warning=hands_off_warning,
+        drowsiness_warning=drowsiness_warning,
+        lcd_text=lcd_text,
+        lcd_color=lcd_color,
+    )
@@ -0,0 +1,493 @@
+"""
+  In-memory stand-ins for the Pi hardware: the MAX30100 on I2C (smbus), the
+  ST7735 SPI device (spidev), the GPIO chip (lgpio), the buzzer (gpiozero) and
+  the curses terminal.
+
+  Call install() before importing max30100, lcd_display or DEMO so their
+  module-level imports resolve to these fakes.
+"""
+
+import curses
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+import numpy as np
+
+import synthetic_ppg
+
+# MAX30100 register map as seen from the bus (mirrors max30100.py, which can't
+# be imported until install() has provided smbus)
+INT_STATUS = 0x00
+INT_ENABLE = 0x01
+FIFO_WR_PTR = 0x02
+OVRFLOW_CTR = 0x03
+FIFO_RD_PTR = 0x04
+FIFO_DATA = 0x05
+MODE_CONFIG = 0x06
+SPO2_CONFIG = 0x07
+PART_ID = 0xFF
+FIFO_DEPTH = 16
+INT_A_FULL = 0x80  # FIFO holds FIFO_DEPTH - 1 samples
+INT_DATA_RDY = 0x30  # HR_RDY | SPO2_RDY: a new sample is in the FIFO
+MODE_SHDN = 0x80
+MODE_HR = 0x02
+SAMPLE_RATES = [50, 100, 167, 200, 400, 600, 800, 1000]  # By SPO2_CONFIG rate bits
+
+
+class FakeSMBus(object):
+    """MAX30100 register file and 16-sample FIFO behind the smbus.SMBus API.
+
+    Samples come from a synthetic PPG array (looped). With realtime=True they
+    become available as wall-clock time passes at sample_rate; otherwise the
+    caller produces them explicitly with advance(n).
+
+    Interrupts enabled in INT_ENABLE latch into INT_STATUS as samples arrive;
+    on_interrupt, if set, is called when the (active-low) INT pin falls, and
+    reading INT_STATUS releases it again.
+
+    Writes to SPO2_CONFIG change the realtime sample rate, a shut-down device
+    (MODE_CONFIG SHDN) produces nothing, and heart-rate-only mode reads red
+    as 0.
+    """
+
+    instances = []
+
+    def __init__(self, bus=1, signal=None, realtime=False, sample_rate=100):
+        self.bus = bus
+        self.signal = signal if signal is not None else synthetic_ppg.generate_ppg(60, seed=0)
+        self.realtime = realtime
+        self.sample_rate = sample_rate
+        self.registers = bytearray(256)
+        self.registers[PART_ID] = 0x11
+        self.fifo = deque()
+        self.overflow = 0
+        self.write_ptr = 0
+        self.read_ptr = 0
+        self.produced = 0  # Samples generated, including those lost to overflow
+        self.transactions = 0
+        self.int_status = 0
+        self.on_interrupt = None
+        self.lock = threading.RLock()  # Like the kernel, serialize bus access across threads
+        self._clock_origin = (time.perf_counter(), 0)  # (time, produced) the realtime schedule runs from
+        self._last = (0, 0)
+        self.closed = threading.Event()  # Set by close(); stops connect_interrupt()'s clock thread
+        FakeSMBus.instances.append(self)
+
+    def advance(self, n):
+        # Let n sample periods elapse on the device
+        with self.lock:
+            if self.registers[MODE_CONFIG] & MODE_SHDN:
+                return
+            red_on = self.registers[MODE_CONFIG] & 0x07 != MODE_HR
+            for _ in range(n):
+                s = self.signal[self.produced % len(self.signal)]
+                self.produced += 1
+                if len(self.fifo) >= FIFO_DEPTH:
+                    self.overflow = min(self.overflow + 1, 0x0F)
+                    continue
+                self.fifo.append((int(s["ir"]), int(s["red"]) if red_on else 0))
+                self.write_ptr = (self.write_ptr + 1) % FIFO_DEPTH
+                self._raise_interrupts()
+
+    def _raise_interrupts(self):
+        enabled = self.registers[INT_ENABLE]
+        status = enabled & INT_DATA_RDY
+        if enabled & INT_A_FULL and len(self.fifo) >= FIFO_DEPTH - 1:
+            status |= INT_A_FULL
+        if status and not self.int_status:
+            self.int_status = status
+            if self.on_interrupt is not None:
+                self.on_interrupt()
+        else:
+            self.int_status |= status
+
+    def _catch_up(self):
+        if self.realtime:
+            now = time.perf_counter()
+            if self.registers[MODE_CONFIG] & MODE_SHDN:
+                self._clock_origin = (now, self.produced)  # Resume from wakeup, not catch up
+                return
+            start, produced = self._clock_origin
+            due = produced + int((now - start) * self.sample_rate)
+            if due > self.produced:
+                self.advance(due - self.produced)
+
+    def _pop_sample(self):
+        if self.fifo:
+            self._last = self.fifo.popleft()
+            self.read_ptr = (self.read_ptr + 1) % FIFO_DEPTH
+            self.overflow = 0
+        ir, red = self._last
+        return [ir >> 8, ir & 0xFF, red >> 8, red & 0xFF]
+
+    def _read_register(self, register):
+        if register == INT_STATUS:
+            status, self.int_status = self.int_status, 0
+            return status
+        if register == FIFO_WR_PTR:
+            return self.write_ptr
+        if register == OVRFLOW_CTR:
+            return self.overflow
+        if register == FIFO_RD_PTR:
+            return self.read_ptr
+        return self.registers[register]
+
+    def read_byte_data(self, addr, register):
+        with self.lock:
+            self.transactions += 1
+            self._catch_up()
+            if register == FIFO_DATA:
+                return self._pop_sample()[0]
+            return self._read_register(register)
+
+    def _write_register(self, register, value):
+        if not 0 <= value <= 0xFF:
+            raise ValueError("value out of range: %s" % value)
+        if register in (MODE_CONFIG, SPO2_CONFIG):
+            self._catch_up()  # Samples due so far come at the old settings
+        self.registers[register] = value
+        if register == SPO2_CONFIG:
+            self.sample_rate = SAMPLE_RATES[(value >> 2) & 0x07]
+        if register in (MODE_CONFIG, SPO2_CONFIG):
+            self._clock_origin = (time.perf_counter(), self.produced)
+
+    def write_byte_data(self, addr, register, value):
+        with self.lock:
+            self.transactions += 1
+            self._write_register(register, value)
+
+    def read_i2c_block_data(self, addr, register, length):
+        if length > 32:
+            raise ValueError("SMBus block reads are limited to 32 bytes")
+        with self.lock:
+            self.transactions += 1
+            self._catch_up()
+            if register == FIFO_DATA:
+                data = []
+                while len(data) < length:
+                    data.extend(self._pop_sample())
+                return data[:length]
+            return [self._read_register(r) for r in range(register, register + length)]
+
+    def write_byte(self, addr, value):
+        # Writes to other devices on the bus, e.g. an I2C mux channel select
+        with self.lock:
+            self.transactions += 1
+
+    def write_i2c_block_data(self, addr, register, data):
+        with self.lock:
+            self.transactions += 1
+            for offset, value in enumerate(data):
+                self._write_register(register + offset, value)
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeSpiDev(object):
+    """spidev.SpiDev that counts what would go over the wire.
+
+    Behind it sits a minimal ST7735: window commands and RAM writes land in
+    ram, and RAM reads (0x2E) over xfer2 answer with 18-bit pixels after a
+    dummy clock. Data sent faster than max_stable_hz arrives corrupted, as on
+    a long ribbon cable, and reads clocked faster than max_read_hz (the
+    controller's 150 ns read cycle) come back garbled. With simulate_wire,
+    transfers take as long as they would on the wire at max_speed_hz.
+    """
+
+    DC_PIN = 24  # Mirrors lcd_display.DC_PIN; read from the fake lgpio to tell commands from data
+
+    def __init__(self):
+        self.mode = 0
+        self.max_speed_hz = 500000
+        self.max_stable_hz = 24000000
+        self.max_read_hz = 6600000
+        self.simulate_wire = False
+        self.bytes_written = 0
+        self.transfers = 0
+        self.is_open = False
+        self.ram = np.zeros((162, 162), dtype=np.uint16)  # RGB565 pixels, largest ST7735 geometry
+        self._command = None
+        self._params = []
+        self._window = [0, 0, 0, 0]  # x0, x1, y0, y1
+        self._cursor = 0
+
+    def open(self, bus, device):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def _dc(self):
+        lgpio = sys.modules.get("lgpio")
+        for chip in getattr(lgpio, "chips", {}).values():
+            if self.DC_PIN in chip.levels:
+                return chip.levels[self.DC_PIN]
+        return 1
+
+    def _wire(self, length, speed_hz=0):
+        self.transfers += max(1, -(-length // 4096))
+        self.bytes_written += length
+        if self.simulate_wire:
+            time.sleep(length * 8.0 / (speed_hz or self.max_speed_hz))
+
+    def _receive(self, data):
+        # Feed written bytes to the panel model
+        if not self._dc():
+            self._command = data[-1] if len(data) else None
+            self._params = []
+            if self._command == 0x2C:
+                self._cursor = 0
+            return
+        if self._command in (0x2A, 0x2B):
+            self._params.extend(data)
+            if len(self._params) >= 4:
+                start, end = (self._params[1], self._params[3])
+                if self._command == 0x2A:
+                    self._window[0:2] = [start, end]
+                else:
+                    self._window[2:4] = [start, end]
+        elif self._command == 0x2C:
+            x0, x1, y0, y1 = self._window
+            pixels = np.frombuffer(data, dtype=">u2", count=len(data) // 2).astype(np.uint16)
+            index = self._cursor // 2 + np.arange(len(pixels))
+            if self.max_speed_hz > self.max_stable_hz:
+                pixels[index % 7 == 0] ^= 0x0020  # A flipped bit in green
+            rows, cols = np.divmod(index, x1 - x0 + 1)
+            inside = (y0 + rows < self.ram.shape[0]) & (x0 + cols < self.ram.shape[1])
+            self.ram[y0 + rows[inside], x0 + cols[inside]] = pixels[inside]
+            self._cursor += len(data)
+
+    def writebytes(self, data):
+        if len(data) > 4096:
+            raise OverflowError("writebytes is limited to 4096 bytes")  # spidev's default bufsiz
+        self._wire(len(data))
+        self._receive(bytes(data))
+
+    def writebytes2(self, data):
+        # Accepts any buffer; the real driver splits it at bufsiz internally
+        view = memoryview(data).cast("B")
+        self._wire(len(view))
+        self._receive(view.tobytes())
+
+    def xfer2(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        self._wire(len(data), speed_hz)
+        if self._dc() or not len(data) or data[0] != 0x2E:
+            self._receive(bytes(data))
+            return list(data)
+        # RAM read: one dummy bit, then R, G, B bytes (6 bits each, MSB-aligned) per pixel
+        x0, x1, y0, y1 = self._window
+        pixels = self.ram[y0:y1 + 1, x0:x1 + 1].ravel()
+        r, g, b = (pixels >> 11) & 0x1F, (pixels >> 5) & 0x3F, pixels & 0x1F
+        rgb = np.stack(((r << 1 | r >> 4) << 2, g << 2, (b << 1 | b >> 4) << 2), axis=1).astype(np.uint8)
+        bits = np.concatenate(([0], np.unpackbits(rgb.ravel()), np.zeros(8 * len(data), dtype=np.uint8)))
+        if (speed_hz or self.max_speed_hz) > self.max_read_hz:
+            bits[1::5] ^= 1  # Garbled readback
+        return [0] + np.packbits(bits[:8 * (len(data) - 1)]).tolist()
+
+    xfer3 = xfer2
+
+
+class FakeGpioChip(object):
+    """State of one lgpio chip handle."""
+
+    def __init__(self):
+        self.levels = {}
+        self.writes = 0
+        self.alerts = {}  # gpio -> edge flags claimed with gpio_claim_alert
+
+
+class FakeCallback(object):
+    """Handle returned by lgpio.callback()."""
+
+    def __init__(self, callbacks, gpio, edge, func):
+        self.gpio = gpio
+        self.edge = edge
+        self.func = func
+        self._callbacks = callbacks
+        callbacks.append(self)
+
+    def cancel(self):
+        if self in self._callbacks:
+            self._callbacks.remove(self)
+
+
+def _make_lgpio():
+    module = types.ModuleType("lgpio")
+    module.RISING_EDGE = 1
+    module.FALLING_EDGE = 2
+    module.BOTH_EDGES = 3
+    module.SET_PULL_UP = 32
+    module.chips = {}
+    module.callbacks = []
+    module.pins = {}  # Externally driven input levels
+
+    def gpiochip_open(chip):
+        handle = len(module.chips)
+        module.chips[handle] = FakeGpioChip()
+        return handle
+
+    def gpiochip_close(handle):
+        module.chips.pop(handle, None)
+
+    def gpio_claim_output(handle, gpio, level=0, lFlags=0):
+        module.chips[handle].levels[gpio] = level
+        return 0
+
+    def gpio_claim_input(handle, gpio, lFlags=0):
+        module.chips[handle].levels.setdefault(gpio, 1)
+        return 0
+
+    def gpio_write(handle, gpio, level):
+        chip = module.chips[handle]
+        chip.levels[gpio] = level
+        chip.writes += 1
+        return 0
+
+    def gpio_read(handle, gpio):
+        return module.chips[handle].levels.get(gpio, 0)
+
+    def gpio_claim_alert(handle, gpio, eFlags, lFlags=0, notify_handle=None):
+        chip = module.chips[handle]
+        chip.alerts[gpio] = eFlags
+        chip.levels.setdefault(gpio, 1)
+        return 0
+
+    def gpio_free(handle, gpio):
+        chip = module.chips.get(handle)
+        if chip is not None:
+            chip.alerts.pop(gpio, None)
+        return 0
+
+    def callback(handle, gpio, edge=module.RISING_EDGE, func=None):
+        return FakeCallback(module.callbacks, gpio, edge, func)
+
+    def set_level(gpio, level):
+        # Test hook, not lgpio API: drive an input pin as the outside world would
+        old = module.pins.get(gpio, 1)
+        module.pins[gpio] = level
+        for chip in module.chips.values():
+            chip.levels[gpio] = level
+        if level == old:
+            return
+        edge = module.RISING_EDGE if level else module.FALLING_EDGE
+        for cb in list(module.callbacks):
+            if cb.gpio == gpio and cb.edge & edge:
+                cb.func(0, gpio, level, time.monotonic_ns())
+
+    module.gpiochip_open = gpiochip_open
+    module.gpiochip_close = gpiochip_close
+    module.gpio_claim_output = gpio_claim_output
+    module.gpio_claim_input = gpio_claim_input
+    module.gpio_write = gpio_write
+    module.gpio_read = gpio_read
+    module.gpio_claim_alert = gpio_claim_alert
+    module.gpio_free = gpio_free
+    module.callback = callback
+    module.set_level = set_level
+    return module
+
+
+class FakeBuzzer(object):
+    """gpiozero.Buzzer that records calls instead of driving a pin."""
+
+    def __init__(self, pin=None, active_high=True, initial_value=False, pin_factory=None):
+        self.pin = pin
+        self.is_active = False
+        self.beeps = 0
+        self.offs = 0
+        self.closed = False
+        self.pattern = None  # (on_time, off_time, n) of the last beep()
+
+    def beep(self, on_time=1, off_time=1, n=None, background=True):
+        self.beeps += 1
+        self.is_active = True
+        self.pattern = (on_time, off_time, n)
+
+    def on(self):
+        self.is_active = True
+
+    def off(self):
+        self.offs += 1
+        self.is_active = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeScreen(object):
+    """Enough of a curses window for DEMO.update() to run without a terminal."""
+
+    def __init__(self, rows=24, cols=80):
+        self.rows = rows
+        self.cols = cols
+        self.addstr_calls = 0
+        self.clears = 0
+
+    def getmaxyx(self):
+        return self.rows, self.cols
+
+    def addstr(self, *args):
+        self.addstr_calls += 1
+
+    def clear(self):
+        self.clears += 1
+
+    def refresh(self):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+
+def connect_interrupt(bus, gpio):
+    """Wire a FakeSMBus's INT pin to gpio on the fake lgpio (install() first).
+
+    A realtime bus also gets a thread that produces samples on schedule, since
+    an interrupt-driven reader leaves the bus idle until INT falls; it runs
+    until bus.close().
+    """
+    lgpio = sys.modules["lgpio"]
+    bus.on_interrupt = lambda: lgpio.set_level(gpio, 0)
+    original_read = bus._read_register
+
+    def read_register(register):
+        value = original_read(register)
+        if register == INT_STATUS:
+            lgpio.set_level(gpio, 1)  # Status read releases the pin
+        return value
+    bus._read_register = read_register
+
+    if bus.realtime:
+        def clock():
+            while not bus.closed.wait(1.0 / bus.sample_rate):
+                with bus.lock:
+                    bus._catch_up()
+        threading.Thread(target=clock, name="fake-max30100-clock", daemon=True).start()
+
+
+def patch_curses():
+    # Module-level curses calls need initscr(); make them no-ops for headless timing
+    curses.color_pair = lambda n: n << 8
+    curses.doupdate = lambda: None
+    curses.curs_set = lambda visibility: None
+    curses.start_color = lambda: None
+    curses.init_pair = lambda pair, fg, bg: None
+    curses.use_default_colors = lambda: None
+
+
+def install():
+    """Register the fakes as smbus, spidev, lgpio and gpiozero."""
+    smbus = types.ModuleType("smbus")
+    smbus.SMBus = FakeSMBus
+    spidev = types.ModuleType("spidev")
+    spidev.SpiDev = FakeSpiDev
+    gpiozero = types.ModuleType("gpiozero")
+    gpiozero.Buzzer = FakeBuzzer
+    sys.modules["smbus"] = smbus
+    sys.modules["spidev"] = spidev
+    sys.modules["lgpio"] = _make_lgpio()
+    sys.modules["gpiozero"] = gpiozero
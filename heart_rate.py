@@ -0,0 +1,300 @@
+"""
+  Streaming vital signs from raw MAX30100 PPG samples: heart rate from the IR
+  channel and SpO2 from the red/IR modulation ratio, for one sensor or for a
+  batch of sensors (one per handlebar grip) sharing a sample clock.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+import bpm_estimators
+import metrics
+from ring_buffer import RingBuffer
+
+
+# Rows of each BatchHeartRate.history sample (one column per channel)
+RAW_IR, RAW_RED, AC_IR, AC_RED = range(4)
+
+
+class BatchHeartRate(object):
+    """Beat-by-beat heart rate and SpO2 for several PPG channels at once.
+
+    update() takes an (n, channels) block per colour. IR and red of every
+    channel go through a single sosfilt call with carried state, and troughs
+    are searched in one vectorized pass over the whole block, so another grip
+    adds columns rather than another trip through the Python loop; only the
+    few candidate beats are visited one by one. Beats are the troughs of the
+    filtered IR signal, at least min_beat_interval seconds apart, above an
+    adaptive per-channel amplitude threshold. Whenever a channel's BPM is
+    refreshed, its SpO2 is taken from one pass over the shared raw/filtered
+    history: R = (AC_red / DC_red) / (AC_ir / DC_ir).
+
+    With an estimator from bpm_estimators, BPM comes from that instead: every
+    estimate_interval seconds it is run over the last window_seconds of
+    filtered IR of every channel that has that much signal (beats are still
+    tracked, for beat_times). SpO2 is refreshed along with the BPM.
+
+    With min_window_seconds set (progressive windowing), a channel gets a
+    provisional BPM as soon as it has that much signal: the window estimator
+    runs over what there is, as soon as there is enough, or the beats found so
+    far are averaged, until the full window (num_intervals intervals) is in.
+    Provisional values with a confidence below min_confidence are held back.
+    A short window has no room for the filter and threshold to settle in, so
+    the first second after a reset is then left out: no beats are taken from
+    it and no window reaches back into it.
+
+    bpm, confidence (0-1) and spo2 are per-channel arrays, NaN/0 until known;
+    provisional marks BPMs from less than the full window, and refreshed the
+    channels whose BPM the latest update() recomputed.
+    """
+
+    def __init__(self, channels=1, fs=100, lowcut=0.8, highcut=2.5, order=5,
+                 min_beat_interval=0.4, num_intervals=10, history_len=1000,
+                 estimator=None, window_seconds=8.0, estimate_interval=1.0,
+                 min_window_seconds=None, min_confidence=0.5):
+        self.channels = channels
+        self.fs = fs
+        self.sos = butter(order, [lowcut, highcut], btype='band', fs=fs, output='sos')
+        self._zi_step = sosfilt_zi(self.sos)
+        self.min_beat_interval = min_beat_interval
+        self.num_intervals = num_intervals  # Inter-beat intervals averaged per BPM
+        self.threshold_ratio = 0.3  # Fraction of the signal envelope a beat must reach
+        self.envelope_half_life = 3.0  # Seconds
+        self.spo2_min_samples = 3 * fs  # History needed before SpO2 is reported
+        # Raw and band-passed IR/red stacked per sample: (RAW_IR..AC_RED, channel)
+        self.history = RingBuffer(history_len, shape=(4, channels))
+        self.beat_times = [deque(maxlen=num_intervals + 1) for _ in range(channels)]
+        self.bpm = np.full(channels, np.nan)
+        self.confidence = np.zeros(channels)
+        self.spo2 = np.full(channels, np.nan)
+        self.provisional = np.zeros(channels, dtype=bool)
+        self.refreshed = np.zeros(channels, dtype=bool)
+        self.estimator = estimator
+        self.window_len = min(int(window_seconds * fs), history_len)  # Samples per estimator window
+        # Samples a channel needs for its first BPM: the full window unless progressive
+        self.min_window_len = self.window_len if min_window_seconds is None else min(int(min_window_seconds * fs), self.window_len)
+        self.progressive = min_window_seconds is not None
+        # After a reset, filter start-up and envelope warm-up: no beats yet, when progressive
+        self.settle_samples = int(1.0 * fs) if self.progressive else 0
+        self.min_confidence = min_confidence  # For provisional BPMs
+        self.estimate_interval = estimate_interval
+        self._since_estimate = 0  # Samples since the estimator last ran
+        self._zi = None
+        self._has_red = False
+        self._tail = np.full((2, channels), np.inf)  # Last two detector samples, so extrema spanning calls are found
+        self._tail_t = np.zeros(2)
+        self._envelope = np.zeros(channels)
+        self._last_beat_value = np.zeros(channels)
+        self._fresh = np.ones(channels, dtype=bool)  # Filter state must be restarted
+        self._count = np.zeros(channels, dtype=np.int64)  # Samples since the channel's last reset
+        self.reset()
+
+    def reset(self, channel=None):
+        # Start over for one channel (e.g. its finger left the sensor), or for all
+        which = slice(None) if channel is None else channel
+        if channel is None:
+            self._zi = None
+            self.history.clear()
+        self._tail[:, which] = np.inf  # Can't be a trough or a trough's neighbour
+        self._envelope[which] = 0.0
+        self._last_beat_value[which] = 0.0
+        self._fresh[which] = True
+        self._count[which] = 0
+        self.bpm[which] = np.nan
+        self.confidence[which] = 0.0
+        self.provisional[which] = False
+        self.spo2[which] = np.nan
+        for ch in range(self.channels) if channel is None else [channel]:
+            self.beat_times[ch].clear()
+
+    def update(self, t, ir, red=None, valid=None):
+        """Feed new samples; returns a per-channel array, True where a beat was found.
+
+        valid marks the channels whose columns hold real samples; the others
+        (e.g. a grip whose sensor is in presence mode) are carried over
+        unchanged: filter state, sample count and envelope stay put, and the
+        history repeats their last samples.
+        """
+        t = np.asarray(t, dtype=float)
+        n = len(t)
+        c = self.channels
+        new_beat = np.zeros(c, dtype=bool)
+        self.refreshed = np.zeros(c, dtype=bool)
+        if n == 0:
+            return new_beat
+        valid = np.ones(c, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+        skip = ~valid
+        start = time.perf_counter()
+        raw = np.empty((n, 2 * c))
+        raw[:, :c] = np.reshape(ir, (n, c))
+        raw[:, c:] = np.reshape(red, (n, c)) if red is not None else 0.0
+        if self._zi is None or self._has_red != (red is not None):
+            self._zi = np.zeros(self._zi_step.shape + (2 * c,))
+            self._has_red = red is not None
+            self._fresh[:] = True
+        if (self._fresh & valid).any():
+            # Start the filter in steady state for the current DC levels
+            cols = np.flatnonzero(np.tile(self._fresh & valid, 2))
+            self._zi[:, :, cols] = self._zi_step[:, :, None] * raw[0, cols]
+            self._fresh &= skip
+        held = np.flatnonzero(np.tile(skip, 2))
+        zi = self._zi[:, :, held]
+        y, self._zi = sosfilt(self.sos, raw, axis=0, zi=self._zi)
+        rows = np.stack((raw[:, :c], raw[:, c:], y[:, :c], y[:, c:]), axis=1)
+        if skip.any():
+            self._zi[:, :, held] = zi
+            last = self.history.latest()
+            rows[:, :, skip] = last[:, skip] if last is not None else 0.0
+        self.history.extend(rows)
+        self._count[valid] += n
+        filtered = time.perf_counter()
+        metrics.observe("filter", filtered - start)
+
+        sig = -y[:, :c]  # Troughs of the IR PPG mark the beats
+        decay = 0.5 ** (n / (self.envelope_half_life * self.fs))
+        self._envelope = np.where(valid, np.maximum(self._envelope * decay, np.abs(sig).max(axis=0)), self._envelope)
+        threshold = self.threshold_ratio * self._envelope
+
+        sig[:, skip] = -np.inf  # No beats in carried-over columns
+        seg = np.concatenate((self._tail, sig))
+        seg_t = np.concatenate((self._tail_t, t))
+        self._tail = seg[-2:].copy()
+        self._tail[:, skip] = np.inf  # As after a reset
+        self._tail_t = seg_t[-2:]
+        mid = seg[1:-1]
+        rows, cols = np.nonzero((mid > seg[:-2]) & (mid >= seg[2:]) & (mid > threshold))
+
+        # Row-major order: chronological within each channel
+        settling = self.settle_samples + n + 1 - self._count  # Per channel, last seg row still inside the settling time
+        for i, ch in zip((rows + 1).tolist(), cols.tolist()):
+            if i <= settling[ch]:
+                continue
+            beats = self.beat_times[ch]
+            if beats and seg_t[i] - beats[-1] < self.min_beat_interval:
+                # Too close to the previous beat: keep whichever trough is deeper
+                if seg[i, ch] > self._last_beat_value[ch]:
+                    beats[-1] = seg_t[i]
+                    self._last_beat_value[ch] = seg[i, ch]
+                    new_beat[ch] = True
+                continue
+            beats.append(seg_t[i])
+            self._last_beat_value[ch] = seg[i, ch]
+            new_beat[ch] = True
+
+        if self.estimator is None:
+            for ch in np.flatnonzero(new_beat):
+                self._update_bpm(ch)
+                self._update_spo2(ch)
+            self.refreshed = new_beat
+        metrics.observe("peak_detection", time.perf_counter() - filtered)
+        if self.estimator is not None:
+            self._since_estimate += n
+            # Also run right away for a channel whose first window (past the settling time) just filled
+            first_window = (valid & (self._count - n - self.settle_samples < self.min_window_len)
+                            & (self._count - self.settle_samples >= self.min_window_len))
+            if self._since_estimate >= self.estimate_interval * self.fs or first_window.any():
+                self._since_estimate = 0
+                self._run_estimator(valid)
+        return new_beat
+
+    def _run_estimator(self, valid):
+        lengths = np.minimum(self._count - self.settle_samples, self.window_len)
+        ready = valid & (lengths >= self.min_window_len)
+        if not ready.any():
+            return
+        start = time.perf_counter()
+        # One call per window length; grips that made contact together share one
+        for length in np.unique(lengths[ready]).tolist():
+            cols = np.flatnonzero(ready & (lengths == length))
+            window = self.history.window(length)[:, AC_IR][:, cols]
+            bpm, confidence = self.estimator.estimate(window, self.fs)
+            for ch, value, conf in zip(cols.tolist(), bpm.tolist(), confidence.tolist()):
+                self._set_bpm(ch, value, conf, length < self.window_len)
+        for ch in np.flatnonzero(self.refreshed):
+            self._update_spo2(ch)
+        metrics.observe("bpm_estimate", time.perf_counter() - start)
+
+    def _set_bpm(self, ch, bpm, confidence, provisional):
+        if provisional and confidence < self.min_confidence:
+            return  # Too unsure to show before the full window is in
+        self.bpm[ch] = bpm
+        self.confidence[ch] = confidence
+        self.provisional[ch] = provisional
+        self.refreshed[ch] = True
+
+    def _update_bpm(self, ch):
+        beats = self.beat_times[ch]
+        provisional = len(beats) <= self.num_intervals
+        ibis = np.diff(np.asarray(beats))
+        if provisional and (not self.progressive or self._count[ch] - self.settle_samples < self.min_window_len or len(ibis) < 2):
+            return  # Not enough beats yet for a stable average
+        confidence = bpm_estimators.interval_confidence(ibis)
+        ibis = ibis[(ibis > 60 / 200) & (ibis < 60 / 40)]  # Plausible 40-200 BPM only
+        if len(ibis):
+            self._set_bpm(ch, 60 / float(np.mean(ibis)), confidence, provisional)
+
+    def _update_spo2(self, ch):
+        if not self._has_red or self._count[ch] < self.spo2_min_samples:
+            return
+        window = self.history.window(self._count[ch])[:, :, ch]
+        dc = window[:, :AC_IR].mean(axis=0)
+        ac = window[:, AC_IR:].std(axis=0)
+        if dc.min() <= 0 or ac[0] <= 0:
+            return
+        ratio = (ac[1] / dc[1]) / (ac[0] / dc[0])
+        # Common empirical calibration; a per-device curve would replace this
+        self.spo2[ch] = float(np.clip(110.0 - 25.0 * ratio, 70.0, 100.0))
+
+
+class StreamingHeartRate(object):
+    """Beat-by-beat heart rate and SpO2 from a single PPG stream.
+
+    A one-channel BatchHeartRate with scalar results: bpm and spo2 are None
+    until known.
+    """
+
+    def __init__(self, fs=100, lowcut=0.8, highcut=2.5, order=5,
+                 min_beat_interval=0.4, num_intervals=10, history_len=1000,
+                 estimator=None, window_seconds=8.0, estimate_interval=1.0,
+                 min_window_seconds=None, min_confidence=0.5):
+        self.batch = BatchHeartRate(1, fs, lowcut, highcut, order,
+                                    min_beat_interval, num_intervals, history_len,
+                                    estimator, window_seconds, estimate_interval,
+                                    min_window_seconds, min_confidence)
+        self.fs = fs
+
+    @property
+    def bpm(self):
+        bpm = self.batch.bpm[0]
+        return None if np.isnan(bpm) else float(bpm)
+
+    @property
+    def confidence(self):
+        return float(self.batch.confidence[0])
+
+    @property
+    def provisional(self):
+        return bool(self.batch.provisional[0])
+
+    @property
+    def spo2(self):
+        spo2 = self.batch.spo2[0]
+        return None if np.isnan(spo2) else float(spo2)
+
+    @property
+    def beat_times(self):
+        return self.batch.beat_times[0]
+
+    def reset(self):
+        # Start over, e.g. when the finger leaves the sensor
+        self.batch.reset()
+
+    def update(self, t, ir, red=None):
+        """Feed new samples; returns the BPM if it was refreshed (a beat, or an estimator run), else None."""
+        self.batch.update(t, ir, red)
+        if self.batch.refreshed[0]:
+            return self.bpm
+        return None
@@ -0,0 +1,65 @@
+"""
+  SMBus access through a TCA9548A I2C multiplexer.
+
+  Every MAX30100 answers at the same fixed address, so grips that share a bus
+  sit on separate mux channels; each MuxChannel looks like a plain SMBus to the
+  driver.
+"""
+
+import threading
+
+TCA9548A_ADDRESS = 0x70
+
+# Per (bus, mux address): the channel currently selected and the lock that
+# keeps "select channel + transaction" atomic across acquisition threads
+_selected = {}
+_locks = {}
+_state_lock = threading.Lock()
+
+
+class MuxChannel(object):
+    """One downstream channel of a TCA9548A, with the smbus.SMBus read/write API.
+
+    The channel is selected before a transaction only when another channel
+    was used since, so a single grip pays no extra bus traffic.
+    """
+
+    def __init__(self, bus, channel, address=TCA9548A_ADDRESS):
+        if not 0 <= channel < 8:
+            raise ValueError("TCA9548A channel must be 0-7, got %s" % channel)
+        self.bus = bus
+        self.channel = channel
+        self.address = address
+        self._key = (id(bus), address)
+        with _state_lock:
+            self._lock = _locks.setdefault(self._key, threading.RLock())
+        self.selects = 0
+
+    def _select(self):
+        if _selected.get(self._key) != self.channel:
+            self.bus.write_byte(self.address, 1 << self.channel)
+            _selected[self._key] = self.channel
+            self.selects += 1
+
+    def read_byte_data(self, addr, register):
+        with self._lock:
+            self._select()
+            return self.bus.read_byte_data(addr, register)
+
+    def write_byte_data(self, addr, register, value):
+        with self._lock:
+            self._select()
+            self.bus.write_byte_data(addr, register, value)
+
+    def read_i2c_block_data(self, addr, register, length):
+        with self._lock:
+            self._select()
+            return self.bus.read_i2c_block_data(addr, register, length)
+
+    def write_i2c_block_data(self, addr, register, data):
+        with self._lock:
+            self._select()
+            self.bus.write_i2c_block_data(addr, register, data)
+
+    def close(self):
+        pass  # The underlying bus is shared with the other channels
@@ -1,6 +1,11 @@
-import lgpio
-import spidev
+import json
+import math
+import metrics
+import numpy as np
+import os
+import threading
 import time
+from collections import OrderedDict
 from PIL import Image, ImageDraw, ImageFont
 
 # Pin configuration (adjusted for swap: DC/A0 to GPIO24, RST to GPIO25)
@@ -19,32 +24,113 @@ Y_OFFSET = 0  # Adjusted for red tab or full alignment
 WIDTH = 160
 HEIGHT = 128
 
-# Open GPIO and SPI
-h = lgpio.gpiochip_open(0)
-lgpio.gpio_claim_output(h, RST_PIN, level=1)
-lgpio.gpio_claim_output(h, DC_PIN, level=1)
-lgpio.gpio_claim_output(h, CS_PIN, level=1)
+# SPI clock: SPI_SPEED_HZ is the known-good default; with SPI_CALIBRATE, init()
+# raises it to the fastest of SPI_CANDIDATE_HZ that passes calibrate_spi_clock()
+SPI_SPEED_HZ = 8000000
+SPI_READ_HZ = 4000000  # RAM readback; the ST7735 read cycle is 150 ns minimum (~6.6 MHz)
+SPI_CANDIDATE_HZ = (32000000, 24000000, 20000000, 16000000, 12000000, 8000000)
+SPI_CALIBRATE = True
+SPIDEV_BUFSIZ_PATH = "/sys/module/spidev/parameters/bufsiz"
 
-spi = spidev.SpiDev()
-spi.open(0, 0)
-spi.mode = 0
-spi.max_speed_hz = 8000000  # Start low, increase if stable (up to 24000000)
+# GPIO chip handle and SPI device, opened by init() rather than on import
+h = None
+spi = None
+initialized = False
+_init_lock = threading.Lock()
+spi_max_transfer = 4096  # Bytes per SPI message; spidev's bufsiz module parameter
+spi_calibration = None  # Result of the last calibrate_spi_clock()
+spi_bytes = 0  # Bytes written by write_sequence() since start
+spi_seconds = 0.0  # Time spent in those writes
+_dc_level = None  # Last level written to DC, so unchanged levels aren't written again
 
-def write_command(cmd):
-    lgpio.gpio_write(h, DC_PIN, 0)
+def open_hardware():
+    # lgpio/spidev are imported here so the module loads (and renders) off the Pi
+    global lgpio, spidev, h, spi, spi_max_transfer, _dc_level
+    import lgpio
+    import spidev
+    h = lgpio.gpiochip_open(0)
+    lgpio.gpio_claim_output(h, RST_PIN, level=1)
+    lgpio.gpio_claim_output(h, DC_PIN, level=1)
+    lgpio.gpio_claim_output(h, CS_PIN, level=1)
+
+    spi = spidev.SpiDev()
+    spi.open(0, 0)
+    spi.mode = 0
+    spi.max_speed_hz = SPI_SPEED_HZ
+    spi_max_transfer = read_spidev_bufsiz()
+    _dc_level = 1
+
+def read_spidev_bufsiz(default=4096):
+    # Largest single SPI message the kernel driver takes
+    try:
+        with open(SPIDEV_BUFSIZ_PATH) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return default
+
+def _require_hardware():
+    # lgpio/spidev only exist as globals once open_hardware() has run
+    if h is None:
+        raise RuntimeError("lcd_display.init() not called")
+
+def _set_dc(level):
+    global _dc_level
+    if level != _dc_level:
+        lgpio.gpio_write(h, DC_PIN, level)
+        _dc_level = level
+
+def _nbytes(data):
+    return len(data) if isinstance(data, list) else memoryview(data).nbytes
+
+def _write(data):
+    # Put one buffer (bytes, bytearray, memoryview, numpy array or list) on the bus as-is
+    if isinstance(data, list):
+        data = bytes(data)
+    if hasattr(spi, "writebytes2"):
+        spi.writebytes2(data)  # Any buffer, split at bufsiz inside the driver: no list per chunk
+    else:
+        view = memoryview(data).cast("B")
+        for i in range(0, len(view), spi_max_transfer):
+            spi.writebytes(list(view[i:i + spi_max_transfer]))  # spidev < 3.4
+
+def write_sequence(commands):
+    # (command, data or None) pairs in one chip-select: only DC toggles in between
+    global spi_bytes, spi_seconds
+    _require_hardware()
+    start = time.perf_counter()
+    sent = 0
     lgpio.gpio_write(h, CS_PIN, 0)
-    spi.writebytes([cmd])
+    for cmd, data in commands:
+        _set_dc(0)
+        _write(bytes((cmd,)))
+        if data is not None and _nbytes(data):
+            _set_dc(1)
+            _write(data)
+            sent += _nbytes(data)
     lgpio.gpio_write(h, CS_PIN, 1)
+    spi_bytes += sent + len(commands)
+    spi_seconds += time.perf_counter() - start
+
+def write_command(cmd):
+    write_sequence([(cmd, None)])
 
 def write_data(data):
-    lgpio.gpio_write(h, DC_PIN, 1)
+    global spi_bytes, spi_seconds
+    _require_hardware()
+    start = time.perf_counter()
+    _set_dc(1)
     lgpio.gpio_write(h, CS_PIN, 0)
-    chunk_size = 4096
-    for i in range (0, len(data), chunk_size):
-        spi.writebytes(data[i:i+chunk_size])
+    _write(data)
     lgpio.gpio_write(h, CS_PIN, 1)
+    spi_bytes += _nbytes(data)
+    spi_seconds += time.perf_counter() - start
+
+def spi_throughput():
+    # Achieved bytes per second over every write so far, including GPIO toggles
+    return spi_bytes / spi_seconds if spi_seconds else 0.0
 
 def reset():
+    _require_hardware()
     lgpio.gpio_write(h, RST_PIN, 1)
     time.sleep(0.01)
     lgpio.gpio_write(h, RST_PIN, 0)
@@ -93,49 +179,350 @@ def init_display():
     write_command(0x29)  # Display on
     time.sleep(0.12)
 
+def window_commands(x0, y0, x1, y1, pixels=None):
+    # write_sequence() commands that set the drawing window and write pixels into it
+    return [
+        (0x2A, bytes((0x00, x0 + X_OFFSET, 0x00, x1 + X_OFFSET))),  # Column addr set
+        (0x2B, bytes((0x00, y0 + Y_OFFSET, 0x00, y1 + Y_OFFSET))),  # Row addr set
+        (0x2C, pixels),  # Write RAM
+    ]
+
 def set_window(x0, y0, x1, y1):
-    write_command(0x2A)  # Column addr set
-    write_data([0x00, x0 + X_OFFSET, 0x00, x1 + X_OFFSET])
-    write_command(0x2B)  # Row addr set
-    write_data([0x00, y0 + Y_OFFSET, 0x00, y1 + Y_OFFSET])
-    write_command(0x2C)  # Write RAM
-
-def display_image(img):
-    # Convert PIL image to RGB565 bytearray
-    buffer = bytearray(WIDTH * HEIGHT * 2)
-    pixels = img.load()
-    for y in range(HEIGHT):
-        for x in range(WIDTH):
-            r, g, b = pixels[x, y]
-            color = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-            idx = (y * WIDTH + x) * 2
-            buffer[idx] = (color >> 8) & 0xFF
-            buffer[idx + 1] = color & 0xFF
-    set_window(0, 0, WIDTH - 1, HEIGHT - 1)
-    write_data(buffer)
-
-# Initialize display
-init_display()
+    write_sequence(window_commands(x0, y0, x1, y1))
+
+def read_ram(x0, y0, x1, y1, speed_hz=None):
+    """Read a window of panel RAM back over MISO as big-endian RGB565 (read at
+    speed_hz, default the current clock), or None if nothing answers.
+
+    The ST7735 sends 18-bit pixels after one dummy clock, so the reply is
+    re-aligned bit by bit; a module without MISO reads as all zeros or ones.
+    """
+    n = (x1 - x0 + 1) * (y1 - y0 + 1)
+    write_sequence(window_commands(x0, y0, x1, y1)[:2])
+    _set_dc(0)
+    lgpio.gpio_write(h, CS_PIN, 0)
+    reply = spi.xfer2([0x2E] + [0x00] * (3 * n + 2), speed_hz or spi.max_speed_hz)  # Read RAM
+    lgpio.gpio_write(h, CS_PIN, 1)
+    bits = np.unpackbits(np.asarray(reply[1:], dtype=np.uint8))
+    if bits.all() or not bits.any():
+        return None
+    return bits
+
+def _rgb565_bits(pixels):
+    # The bits the panel returns for RGB565 pixels: 6 bits per channel, MSB-aligned bytes
+    pixels = pixels.astype(np.uint16)
+    r = ((pixels >> 11) & 0x1F) << 3
+    g = ((pixels >> 5) & 0x3F) << 2
+    b = (pixels & 0x1F) << 3
+    return np.unpackbits(np.stack((r, g, b), axis=1).astype(np.uint8).ravel())
+
+def _ram_matches(bits, pixels):
+    # Red/blue LSB is filled in by the panel, so compare only the written bits
+    expected = _rgb565_bits(pixels)
+    mask = np.unpackbits(np.tile(np.array([0xF8, 0xFC, 0xF8], dtype=np.uint8), len(pixels)))
+    for offset in range(9):  # Dummy clock(s) before the data
+        got = bits[offset:offset + len(expected)]
+        if len(got) == len(expected) and not ((got ^ expected) & mask).any():
+            return True
+    return False
+
+def calibrate_spi_clock(candidates=SPI_CANDIDATE_HZ, repeats=3, safe_hz=SPI_SPEED_HZ, read_hz=SPI_READ_HZ):
+    """Find the fastest clock at which pixel writes arrive intact.
+
+    A pseudo-random strip is written at each candidate clock, fastest first,
+    and read back at read_hz, within the panel's slower read timing; the
+    first clock that verifies repeats times in a row is kept. Without MISO
+    nothing can be verified and safe_hz stays.
+    Returns a dict with the chosen clock, whether it was verified and the
+    clocks that failed.
+    """
+    global last_frame
+    x0, y0, x1, y1 = 0, HEIGHT - 1, 31, HEIGHT - 1  # Bottom-left strip, overdrawn by the first frame
+    rng = np.random.default_rng(0)
+    failed = []
+    result = {"speed_hz": safe_hz, "verified": False, "failed_hz": failed}
+    for speed in sorted(candidates, reverse=True):
+        spi.max_speed_hz = speed
+        ok = True
+        for _ in range(repeats):
+            pixels = rng.integers(0, 0x10000, x1 - x0 + 1, dtype=np.uint16).astype(">u2")
+            write_sequence(window_commands(x0, y0, x1, y1, pixels))
+            bits = read_ram(x0, y0, x1, y1, read_hz)
+            if bits is None:
+                spi.max_speed_hz = safe_hz
+                last_frame = None
+                return result  # No readback wired
+            if not _ram_matches(bits, pixels):
+                ok = False
+                break
+        if ok:
+            result.update(speed_hz=speed, verified=True)
+            break
+        failed.append(speed)
+    spi.max_speed_hz = result["speed_hz"]
+    last_frame = None  # The strip is on the panel now
+    return result
+
+def image_to_rgb565_array(img):
+    # Convert PIL image to a HEIGHT x WIDTH big-endian RGB565 array, whole frame at once
+    rgb = np.asarray(img.convert("RGB"), dtype=np.uint16)
+    color = ((rgb[..., 0] & 0xF8) << 8) | ((rgb[..., 1] & 0xFC) << 3) | (rgb[..., 2] >> 3)
+    return color.astype(">u2")
+
+def image_to_rgb565(img):
+    return image_to_rgb565_array(img).tobytes()
+
+# Last framebuffer sent to the panel, so later frames only push what changed
+last_frame = None
+
+def dirty_rects(old, new, max_gap=4):
+    # Bounding boxes (x0, y0, x1, y1) of changed pixels, one per band of changed rows.
+    # Bands closer than max_gap rows are merged to save set_window round trips.
+    rows = np.flatnonzero((old != new).any(axis=1))
+    if len(rows) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > max_gap) + 1
+    rects = []
+    for band in np.split(rows, breaks):
+        y0, y1 = int(band[0]), int(band[-1])
+        cols = np.flatnonzero((old[y0:y1 + 1] != new[y0:y1 + 1]).any(axis=0))
+        rects.append((int(cols[0]), y0, int(cols[-1]), y1))
+    return rects
+
+def display_image(img, full=False):
+    return display_frame(image_to_rgb565_array(img), full)
+
+def display_frame(frame, full=False):
+    # Push only the regions that differ from the last frame; returns bytes sent over SPI
+    global last_frame
+    if full or last_frame is None:
+        rects = [(0, 0, WIDTH - 1, HEIGHT - 1)]
+    else:
+        rects = dirty_rects(last_frame, frame)
+    sent = 0
+    commands = []
+    for x0, y0, x1, y1 in rects:
+        # Full-width bands are views of the frame; narrower ones take one contiguous copy
+        pixels = np.ascontiguousarray(frame[y0:y1 + 1, x0:x1 + 1])
+        commands += window_commands(x0, y0, x1, y1, pixels)
+        sent += pixels.nbytes
+    write_sequence(commands)
+    last_frame = frame
+    return sent
+
+def measure_fps(frames=30):
+    # Time full-frame updates; returns (frames per second, ms spent converting per frame)
+    global last_frame
+    image = Image.new("RGB", (WIDTH, HEIGHT), (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    convert_time = 0.0
+    start = time.perf_counter()
+    for i in range(frames):
+        draw.rectangle((0, 0, WIDTH - 1, HEIGHT - 1), fill=(i * 8 % 256, 255 - i * 8 % 256, 128))
+        t0 = time.perf_counter()
+        buffer = image_to_rgb565_array(image)
+        convert_time += time.perf_counter() - t0
+        write_sequence(window_commands(0, 0, WIDTH - 1, HEIGHT - 1, buffer))
+    elapsed = time.perf_counter() - start
+    last_frame = None  # Panel no longer matches the cached frame
+    return frames / elapsed, convert_time / frames * 1000
+
+def init():
+    # Open GPIO/SPI and bring the panel up; takes ~0.5 s of reset delays, safe to call again
+    global initialized, spi_calibration
+    with _init_lock:
+        if initialized:
+            return
+        open_hardware()
+        init_display()
+        if SPI_CALIBRATE:
+            spi_calibration = calibrate_spi_clock()
+        initialized = True
 
 # Create image with text
 # image = Image.new("RGB", (WIDTH, HEIGHT), (0, 0, 0))  # Black background
 # draw = ImageDraw.Draw(image)
 #font = ImageFont.load_default()  # Small default font for test
-font = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf", 32) #larger font
+FONT_PATH = "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf"
+FONT_SIZE = 32  # larger font
+font = None  # Loaded on first use by get_font()
+
+def get_font():
+    global font, FONT_PATH
+    if font is None:
+        try:
+            font = ImageFont.truetype(FONT_PATH, FONT_SIZE)
+        except OSError:
+            # Liberation fonts missing (e.g. benchmarking off the Pi); use Pillow's built-in font
+            FONT_PATH = "default"
+            font = ImageFont.load_default(FONT_SIZE)
+    return font
 # draw.text((30, 30), "Aumovio \nEng. Solutions!", font=font, fill=(0, 255, 0))  
 
 #Display it
 # display_image(image)
 
-def display_text (text, color = (255, 255, 255)):
+# Screens that never change; kept in the on-disk frame store so they are ready at start
+FIXED_SCREENS = [
+    ("AUMOVIO\n Eng. \n Solutions", (0, 255, 0)),
+    ("HANDS \n OFF", (255, 0, 0)),
+    ("HIGH \nHeart Rate", (255, 0, 0)),
+    ("Heart Rate\n-- bpm", (128, 128, 128)),
+]
+
+FRAME_CACHE_SIZE = 32  # Rendered frames kept in memory, least recently used evicted first
+frame_cache = OrderedDict()
+frame_store = {}  # Frames memory-mapped from disk by load_frame_store()
+
+def _frame_key(text, color):
+    get_font()  # Settles FONT_PATH if the fallback font is in use
+    return (text, tuple(color), (FONT_PATH, FONT_SIZE))
+
+TEXT_X = 10  # Left edge of every text line
+TEXT_Y = 20  # Top of the first line
+LINE_SPACING = 30
+
+def render_text(text, color = (255, 255, 255)):
     image = Image.new("RGB", (WIDTH, HEIGHT), (0, 0, 0))  # Black background
     draw = ImageDraw.Draw(image)
     lines = text.split('\n')
-    y_pos = 20
+    y_pos = TEXT_Y
     for line in lines:
-        draw.text((10,y_pos), line, font=font, fill=color)
-        y_pos += 30
-    display_image(image)
+        draw.text((TEXT_X,y_pos), line, font=get_font(), fill=color)
+        y_pos += LINE_SPACING
+    return image_to_rgb565_array(image)
+
+# Glyph atlas: what the live readouts are made of, rasterized once per colour
+ATLAS_LABELS = ["Heart Rate", "bpm", "SpO2"]  # Kept whole, so their kerning matches render_text()
+ATLAS_CHARS = "0123456789.-% "
+
+class GlyphAtlas(object):
+    """Text pieces pre-rendered as RGB565 blocks in one colour.
+
+    compose() lays out a screen by copying blocks into a black framebuffer
+    at the same positions render_text() would draw them, so a changing BPM
+    costs a few numpy slice copies instead of a PIL render and conversion.
+    """
+
+    def __init__(self, color, font, labels=ATLAS_LABELS, chars=ATLAS_CHARS):
+        self.color = tuple(color)
+        ascent, descent = font.getmetrics()
+        self.height = ascent + descent
+        self.blocks = {}  # Piece -> (RGB565 block cropped to its ink, its (dx, dy), advance in pixels)
+        for piece in list(labels) + list(chars):
+            advance = font.getlength(piece)
+            width = max(1, int(math.ceil(max(advance, font.getbbox(piece)[2]))))
+            image = Image.new("RGB", (width, self.height), (0, 0, 0))
+            ImageDraw.Draw(image).text((0, 0), piece, font=font, fill=self.color)
+            block = image_to_rgb565_array(image)
+            rows = np.flatnonzero(block.any(axis=1))
+            cols = np.flatnonzero(block.any(axis=0))
+            if len(rows):
+                block = block[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1].astype(np.uint16)
+                offset = (int(cols[0]), int(rows[0]))
+            else:
+                block, offset = np.zeros((0, 0), dtype=np.uint16), (0, 0)  # A space: advance only
+            self.blocks[piece] = (block, offset, advance)
+        # Longest first, so "SpO2" isn't taken apart into characters
+        self._labels = sorted(labels, key=len, reverse=True)
+
+    def split(self, line):
+        # Atlas pieces spelling line, or None if it needs a character the atlas lacks
+        pieces = []
+        i = 0
+        while i < len(line):
+            label = next((l for l in self._labels if line.startswith(l, i)), None)
+            piece = label or line[i]
+            if piece not in self.blocks:
+                return None
+            pieces.append(piece)
+            i += len(piece)
+        return pieces
+
+    def compose(self, text):
+        # RGB565 frame for text, or None if the atlas can't spell it
+        lines = [self.split(line) for line in text.split('\n')]
+        if any(pieces is None for pieces in lines):
+            return None
+        # Composed in native byte order; on black, a brighter shade of one colour is
+        # also the larger RGB565 value, so overlapping ink merges with a maximum
+        frame = np.zeros((HEIGHT, WIDTH), dtype=np.uint16)
+        y = TEXT_Y
+        for pieces in lines:
+            x = float(TEXT_X)
+            for piece in pieces:
+                block, (dx, dy), advance = self.blocks[piece]
+                x0, y0 = int(round(x)) + dx, y + dy
+                h = min(block.shape[0], HEIGHT - y0)
+                w = min(block.shape[1], WIDTH - x0)
+                if h > 0 and w > 0:
+                    target = frame[y0:y0 + h, x0:x0 + w]
+                    np.maximum(target, block[:h, :w], out=target)
+                x += advance
+            y += LINE_SPACING
+        return frame.astype(">u2")
+
+atlases = {}  # (colour, font key) -> GlyphAtlas
+
+def get_atlas(color):
+    key = (tuple(color), (FONT_PATH, FONT_SIZE))
+    atlas = atlases.get(key)
+    if atlas is None:
+        atlas = atlases[key] = GlyphAtlas(color, get_font())
+    return atlas
+
+def get_text_frame(text, color = (255, 255, 255)):
+    # Finished RGB565 frame for text, from the LRU cache or disk store when possible
+    key = _frame_key(text, color)
+    frame = frame_cache.get(key)
+    if frame is not None:
+        frame_cache.move_to_end(key)
+        return frame
+    frame = frame_store.get(key)
+    if frame is None:
+        frame = get_atlas(color).compose(text)  # Readouts: copied together from glyphs
+    if frame is None:
+        frame = render_text(text, color)
+    frame.flags.writeable = False
+    frame_cache[key] = frame
+    if len(frame_cache) > FRAME_CACHE_SIZE:
+        frame_cache.popitem(last=False)
+    return frame
+
+def save_frame_store(path, screens=FIXED_SCREENS):
+    # Render screens into path.npy (stacked frames) and path.json (their keys)
+    frames = np.stack([render_text(text, color) for text, color in screens])
+    keys = [list(_frame_key(text, color)) for text, color in screens]
+    np.save(path + ".npy", frames)
+    with open(path + ".json", "w") as f:
+        json.dump(keys, f)
+
+def load_frame_store(path, build=True):
+    # Memory-map a frame store written by save_frame_store(), building it first if missing.
+    # It only saves render time: if it can't be written (e.g. a read-only install
+    # directory), 0 frames are loaded and every screen is rendered live
+    if build and not (os.path.exists(path + ".npy") and os.path.exists(path + ".json")):
+        try:
+            save_frame_store(path)
+        except OSError:
+            return 0
+    try:
+        frames = np.load(path + ".npy", mmap_mode="r")
+        with open(path + ".json") as f:
+            keys = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if frames.shape[1:] != (HEIGHT, WIDTH) or len(frames) != len(keys):
+        return 0  # Stale store from another panel geometry
+    for (text, color, font_key), frame in zip(keys, frames):
+        frame_store[(text, tuple(color), tuple(font_key))] = frame
+    return len(keys)
+
+def display_text (text, color = (255, 255, 255)):
+    with metrics.timed("lcd_render"):
+        frame = get_text_frame(text, color)
+    with metrics.timed("spi_write"):
+        return display_frame(frame)
     # bbox = font.getbbox(text) # Get text size
     # font_width = bbox[2] - bbox[0]
     # font_height = bbox[3] - bbox[1]
@@ -148,6 +535,98 @@ def display_text (text, color = (255, 255, 255)):
     # draw.text((30,30), text, font=font, fill=color)
     # display_image(image)
 
+class DisplayWorker(object):
+    """Single long-lived thread that owns the SPI bus and GPIO handle.
+
+    show() posts to a one-slot, latest-wins mailbox: a frame that has not been
+    drawn yet is replaced by a newer one, so the panel never lags behind or
+    shows a stale frame after a fresh one.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._running = False
+        self._thread = None
+        self.posted = 0
+        self.dropped = 0  # Frames replaced before they were drawn
+        self.drawn = 0
+        self.last_render_time = 0.0
+        self.max_render_time = 0.0
+        self.last_error = None
+
+    @property
+    def queue_depth(self):
+        with self._cond:
+            return 0 if self._pending is None else 1
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="lcd-display", daemon=True)
+            self._thread.start()
+
+    def show(self, text, color = (255, 255, 255), since=None, stage="event_to_lcd"):
+        # since: perf_counter() time of the event behind this frame; the delay
+        # until the frame is on the panel is recorded as stage
+        if not self._running:
+            self.start()
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (text, color, since, stage)
+            self.posted += 1
+            self._cond.notify()
+
+    def flush(self, timeout=None):
+        # Wait until the newest posted frame is on the panel
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def stop(self, timeout=2.0):
+        # Draw whatever is still pending, then end the thread
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if self._pending is None:
+                    return
+                text, color, since, stage = self._pending
+                self._pending = None
+                self._busy = True
+            start = time.perf_counter()
+            try:
+                init()
+                display_text(text, color)
+            except Exception as e:  # Keep the worker alive; a bad frame must not blank the panel for good
+                self.last_error = e
+            end = time.perf_counter()
+            elapsed = end - start
+            if since is not None:
+                metrics.observe(stage, end - since)
+            with self._cond:
+                self._busy = False
+                self.drawn += 1
+                self.last_render_time = elapsed
+                self.max_render_time = max(self.max_render_time, elapsed)
+                self._cond.notify_all()
+
+worker = DisplayWorker()
+
+def show_text(text, color = (255, 255, 255), since=None, stage="event_to_lcd"):
+    # Non-blocking display_text() through the shared worker
+    worker.show(text, color, since, stage)
+
 # Comment out or remove these lines to prevent closing on import
 # display_text ("AUMOVIO\n Eng. Sol.", (0,255,0))
 
@@ -158,5 +637,9 @@ def display_text (text, color = (255, 255, 255)):
 
 # Optional: Add this function if you want to close resources explicitly later
 def cleanup():
-    lgpio.gpiochip_close(h)
-    spi.close()
\ No newline at end of file
+    global initialized, h, spi
+    if h is not None:
+        lgpio.gpiochip_close(h)
+        spi.close()
+    h = spi = None
+    initialized = False
\ No newline at end of file
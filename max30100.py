@@ -7,7 +7,9 @@
   September 2017
 """
 
-import smbus
+import numpy as np
+
+from ring_buffer import RingBuffer
 
 INT_STATUS   = 0x00  # Which interrupts are tripped
 INT_ENABLE   = 0x01  # Which interrupts are active
@@ -25,6 +27,19 @@ PART_ID      = 0xFF  # Part ID, normally 0x11
 
 I2C_ADDRESS  = 0x57  # I2C address of the MAX30100 device
 
+FIFO_DEPTH    = 16  # Samples held by the on-chip FIFO
+SAMPLE_BYTES  = 4   # IR (16 bit) followed by red (16 bit)
+MAX_BLOCK_LEN = 32  # Largest SMBus block read, i.e. 8 samples per transaction
+
+# One drained FIFO sample: device sample index, timestamp in seconds on the
+# device sample clock, and the raw IR / red readings.
+FIFO_SAMPLE_DTYPE = np.dtype([
+    ("index", np.int64),
+    ("t", np.float64),
+    ("ir", np.uint16),
+    ("red", np.uint16),
+])
+
 
 PULSE_WIDTH = {
     200: 0,
@@ -69,6 +84,11 @@ def _get_valid(d, value):
     except KeyError:
         raise KeyError("Value %s not valid, use one of: %s" % (value, ', '.join([str(s) for s in d.keys()])))
 
+def _sample_rate(spo2_config):
+    # Sample rate in Hz selected by an SPO2_CONFIG value
+    rate_bits = (spo2_config >> 2) & 0x07
+    return next(rate for rate, bits in SAMPLE_RATE.items() if bits == rate_bits)
+
 def _twos_complement(val, bits):
     """compute the 2's complement of int value val"""
     if (val & (1 << (bits - 1))) != 0: # if sign bit is set e.g., 8bit: 128-255
@@ -80,6 +100,18 @@ INTERRUPT_HR = 1
 INTERRUPT_TEMP = 2
 INTERRUPT_FIFO = 3
 
+INT_A_FULL = 0x80  # INT_STATUS bit: FIFO holds FIFO_DEPTH - 1 samples
+
+# Configuration registers kept in the write-through shadow, with their
+# power-on values, and the MODE_CONFIG bits the device clears by itself.
+CONFIG_DEFAULTS = {
+    INT_ENABLE: 0x00,
+    MODE_CONFIG: 0x00,
+    SPO2_CONFIG: 0x00,
+    LED_CONFIG: 0x00,
+}
+MODE_SELF_CLEARING = 0x48  # RESET and TEMP_EN
+
 MODE_HR = 0x02
 MODE_SPO2 = 0x03
 
@@ -96,43 +128,122 @@ class MAX30100(object):
                  max_buffer_len=10000
                  ):
 
-        # Default to the standard I2C bus on Pi.
-        self.i2c = i2c if i2c else smbus.SMBus(1)
+        # Default to the standard I2C bus on Pi; smbus is only needed for real hardware.
+        if i2c is None:
+            import smbus
+            i2c = smbus.SMBus(1)
+        self.i2c = i2c
+        self.transactions = 0  # I2C transactions issued by this driver
+
+        # Last value written to each configuration register, seeded from the
+        # device: the sensor may still be configured from an earlier run
+        self._shadow = {}
+        self.refresh_shadow()
+
+        # Device sample clock: count of samples produced since the stream
+        # started, including the ones lost to FIFO overflow. Timestamps run
+        # from the (index, seconds) origin at the current sample rate, so a
+        # rate change doesn't bend the timeline of earlier samples.
+        self.sample_clock = 0
+        self.dropped_samples = 0
+        self._clock_origin = (0, 0.0)
+        self.sample_rate = sample_rate
 
         self.set_mode(MODE_HR)  # Trigger an initial temperature read.
         self.set_led_current(led_current_red, led_current_ir)
         self.set_spo_config(sample_rate, pulse_width)
 
-        # Reflectance data (latest update)
-        self.buffer_red = []
-        self.buffer_ir = []
-
+        # Reflectance data history, shared with consumers of the samples
         self.max_buffer_len = max_buffer_len
-        self._interrupt = None
+        self.samples = RingBuffer(max_buffer_len, FIFO_SAMPLE_DTYPE)
+
+    def _read_register(self, register):
+        self.transactions += 1
+        return self.i2c.read_byte_data(I2C_ADDRESS, register)
+
+    def _read_registers(self, register, length):
+        # One block read of length consecutive registers
+        self.transactions += 1
+        return self.i2c.read_i2c_block_data(I2C_ADDRESS, register, length)
+
+    def _write_register(self, register, value):
+        self.transactions += 1
+        self.i2c.write_byte_data(I2C_ADDRESS, register, value)
+
+    def _write_config(self, register, value):
+        # Write-through: the shadow answers later read-modify-writes, and a
+        # write that would not change the register is skipped altogether
+        if self._shadow.get(register) == value:
+            return
+        self._write_register(register, value)
+        if register == MODE_CONFIG:
+            value &= ~MODE_SELF_CLEARING
+        self._shadow[register] = value
+
+    def refresh_shadow(self):
+        # Re-read the configuration, e.g. if something else may have changed it. MODE_CONFIG
+        # to LED_CONFIG are contiguous and come in one block read; INT_ENABLE is read on its
+        # own, since the FIFO registers in between can't be read without side effects
+        int_enable = self._read_register(INT_ENABLE)
+        mode, spo2, _, led = self._read_registers(MODE_CONFIG, LED_CONFIG - MODE_CONFIG + 1)
+        self._shadow.update({INT_ENABLE: int_enable, MODE_CONFIG: mode & ~MODE_SELF_CLEARING,
+                             SPO2_CONFIG: spo2, LED_CONFIG: led})
+
+    def save_config(self):
+        # The shadowed configuration registers, for restore_config()
+        return dict(self._shadow)
+
+    def restore_config(self, config):
+        # Write back a save_config() result; registers that already match cost nothing
+        for register in (SPO2_CONFIG, LED_CONFIG, MODE_CONFIG):
+            self._write_config(register, config[register])
+        self._set_clock_rate(_sample_rate(config[SPO2_CONFIG]))
+
+    def _set_clock_rate(self, sample_rate):
+        if sample_rate != self.sample_rate:
+            self._clock_origin = (self.sample_clock, self.sample_times(self.sample_clock))
+            self.sample_rate = sample_rate
+
+    def sample_times(self, index):
+        # Device-clock time in seconds of sample index (scalar or array)
+        origin_index, origin_t = self._clock_origin
+        return origin_t + (index - origin_index) / self.sample_rate
+
+    @property
+    def buffer_red(self):
+        return self.samples.window()["red"]
+
+    @property
+    def buffer_ir(self):
+        return self.samples.window()["ir"]
 
     @property
     def red(self):
-        return self.buffer_red[-1] if self.buffer_red else None
+        latest = self.samples.latest()
+        return int(latest["red"]) if latest is not None else None
 
     @property
     def ir(self):
-        return self.buffer_ir[-1] if self.buffer_ir else None
+        latest = self.samples.latest()
+        return int(latest["ir"]) if latest is not None else None
 
     def set_led_current(self, led_current_red=11.0, led_current_ir=11.0):
         # Validate the settings, convert to bit values.
         led_current_red = _get_valid(LED_CURRENT, led_current_red)
         led_current_ir = _get_valid(LED_CURRENT, led_current_ir)
-        self.i2c.write_byte_data(I2C_ADDRESS, LED_CONFIG, (led_current_red << 4) | led_current_ir)
+        self._write_config(LED_CONFIG, (led_current_red << 4) | led_current_ir)
 
     def set_mode(self, mode):
-        reg = self.i2c.read_byte_data(I2C_ADDRESS, MODE_CONFIG)
-        self.i2c.write_byte_data(I2C_ADDRESS, MODE_CONFIG, reg & 0x74) # mask the SHDN bit
-        self.i2c.write_byte_data(I2C_ADDRESS, MODE_CONFIG, reg | mode)
+        reg = self._shadow[MODE_CONFIG]
+        self._write_config(MODE_CONFIG, (reg & 0x74) | mode) # mask the SHDN bit
 
     def set_spo_config(self, sample_rate=100, pulse_width=1600):
-        reg = self.i2c.read_byte_data(I2C_ADDRESS, SPO2_CONFIG)
-        reg = reg & 0xFC  # Set LED pulsewidth to 00
-        self.i2c.write_byte_data(I2C_ADDRESS, SPO2_CONFIG, reg | pulse_width)
+        # Validate the settings, convert to bit values.
+        sample_rate_bits = _get_valid(SAMPLE_RATE, sample_rate)
+        pulse_width_bits = _get_valid(PULSE_WIDTH, pulse_width)
+        reg = self._shadow[SPO2_CONFIG] & 0xE0  # Clear sample rate and LED pulsewidth bits
+        self._write_config(SPO2_CONFIG, reg | (sample_rate_bits << 2) | pulse_width_bits)
+        self._set_clock_rate(sample_rate)
 
     def enable_spo2(self):
         self.set_mode(MODE_SPO2)
@@ -141,59 +252,106 @@ class MAX30100(object):
         self.set_mode(MODE_HR)
 
     def enable_interrupt(self, interrupt_type):
-        self.i2c.write_byte_data(I2C_ADDRESS, INT_ENABLE, (interrupt_type + 1)<<4)
-        self.i2c.read_byte_data(I2C_ADDRESS, INT_STATUS)
+        # ENB_SPO2_RDY is bit 4, ENB_HR_RDY bit 5, ENB_TEMP_RDY bit 6, ENB_A_FULL bit 7
+        self._write_config(INT_ENABLE, 1 << (interrupt_type + 4))
+        self._read_register(INT_STATUS)
+
+    def get_interrupt_status(self):
+        # Reading INT_STATUS clears it and releases the (active-low) INT pin
+        return self._read_register(INT_STATUS)
 
     def get_number_of_samples(self):
-        write_ptr = self.i2c.read_byte_data(I2C_ADDRESS, FIFO_WR_PTR)
-        read_ptr = self.i2c.read_byte_data(I2C_ADDRESS, FIFO_RD_PTR)
+        write_ptr, _, read_ptr = self._read_registers(FIFO_WR_PTR, 3)
         return abs(16+write_ptr - read_ptr) % 16
 
     def read_sensor(self):
-        bytes = self.i2c.read_i2c_block_data(I2C_ADDRESS, FIFO_DATA, 4)
-        # Add latest values.
-        self.buffer_ir.append(bytes[0]<<8 | bytes[1])
-        self.buffer_red.append(bytes[2]<<8 | bytes[3])
-        # Crop our local FIFO buffer to length.
-        self.buffer_red = self.buffer_red[-self.max_buffer_len:]
-        self.buffer_ir = self.buffer_ir[-self.max_buffer_len:]
+        bytes = self._read_registers(FIFO_DATA, 4)
+        # Add latest values; the ring buffer drops the oldest at capacity.
+        index = self.sample_clock
+        self.samples.append((index, self.sample_times(index), bytes[0]<<8 | bytes[1], bytes[2]<<8 | bytes[3]))
+        self.sample_clock += 1
+
+    def read_fifo(self, almost_full=False):
+        """Drain every pending FIFO sample.
+
+        The pointer and overflow registers are fetched in one block read and
+        the samples in as few block reads as SMBus allows (8 per transaction).
+        Timestamps come from the device sample clock, so samples lost to an
+        overflow show up as a gap rather than shifting later samples.
+
+        Equal pointers mean either an empty or a completely full FIFO; pass
+        almost_full=True when the A_FULL interrupt was just seen to read them
+        as full.
+
+        Returns (samples, dropped): a FIFO_SAMPLE_DTYPE array, oldest first,
+        and the number of samples lost since the previous drain.
+        """
+        write_ptr, overflow, read_ptr = self._read_registers(FIFO_WR_PTR, 3)
+        if overflow or (almost_full and write_ptr == read_ptr):
+            # The FIFO is full (and with overflow, newer samples were discarded).
+            num_samples = FIFO_DEPTH
+        else:
+            num_samples = (write_ptr - read_ptr) % FIFO_DEPTH
+
+        raw = []
+        remaining = num_samples * SAMPLE_BYTES
+        while remaining:
+            length = min(remaining, MAX_BLOCK_LEN)
+            raw.extend(self._read_registers(FIFO_DATA, length))
+            remaining -= length
+        values = np.frombuffer(bytes(raw), dtype=">u2").reshape(-1, 2)
+
+        samples = np.empty(num_samples, dtype=FIFO_SAMPLE_DTYPE)
+        samples["index"] = self.sample_clock + np.arange(num_samples)
+        samples["t"] = self.sample_times(samples["index"])
+        samples["ir"] = values[:, 0]
+        samples["red"] = values[:, 1]
+
+        self.sample_clock += num_samples + overflow
+        self.dropped_samples += overflow
+
+        self.samples.extend(samples)
+        return samples, overflow
 
     def shutdown(self):
-        reg = self.i2c.read_byte_data(I2C_ADDRESS, MODE_CONFIG)
-        self.i2c.write_byte_data(I2C_ADDRESS, MODE_CONFIG, reg | 0x80)
+        self._write_config(MODE_CONFIG, self._shadow[MODE_CONFIG] | 0x80)
 
     def reset(self):
-        reg = self.i2c.read_byte_data(I2C_ADDRESS, MODE_CONFIG)
-        self.i2c.write_byte_data(I2C_ADDRESS, MODE_CONFIG, reg | 0x40)
+        self._write_config(MODE_CONFIG, self._shadow[MODE_CONFIG] | 0x40)
+        self._shadow.update(CONFIG_DEFAULTS)  # Every register is back at its power-on value
+        self._set_clock_rate(_sample_rate(CONFIG_DEFAULTS[SPO2_CONFIG]))  # And so is the sample rate
 
     def refresh_temperature(self):
-        reg = self.i2c.read_byte_data(I2C_ADDRESS, MODE_CONFIG)
-        self.i2c.write_byte_data(I2C_ADDRESS, MODE_CONFIG, reg | (1 << 3))
+        self._write_config(MODE_CONFIG, self._shadow[MODE_CONFIG] | (1 << 3))
 
     def get_temperature(self):
-        intg = _twos_complement(self.i2c.read_byte_data(I2C_ADDRESS, TEMP_INTG))
-        frac = self.i2c.read_byte_data(I2C_ADDRESS, TEMP_FRAC)
-        return intg + (frac * 0.0625)
+        intg, frac = self._read_registers(TEMP_INTG, 2)
+        return _twos_complement(intg, 8) + (frac * 0.0625)
 
     def get_rev_id(self):
-        return self.i2c.read_byte_data(I2C_ADDRESS, REV_ID)
+        return self._read_register(REV_ID)
 
     def get_part_id(self):
-        return self.i2c.read_byte_data(I2C_ADDRESS, PART_ID)
+        return self._read_register(PART_ID)
 
     def get_registers(self):
+        # Contiguous ranges in one block read each (5 transactions instead of 13)
+        int_status, int_enable, write_ptr, overflow, read_ptr = self._read_registers(INT_STATUS, 5)
+        mode, spo2, _, led = self._read_registers(MODE_CONFIG, LED_CONFIG - MODE_CONFIG + 1)
+        temp_intg, temp_frac = self._read_registers(TEMP_INTG, 2)
+        rev_id, part_id = self._read_registers(REV_ID, 2)
         return {
-            "INT_STATUS": self.i2c.read_byte_data(I2C_ADDRESS, INT_STATUS),
-            "INT_ENABLE": self.i2c.read_byte_data(I2C_ADDRESS, INT_ENABLE),
-            "FIFO_WR_PTR": self.i2c.read_byte_data(I2C_ADDRESS, FIFO_WR_PTR),
-            "OVRFLOW_CTR": self.i2c.read_byte_data(I2C_ADDRESS, OVRFLOW_CTR),
-            "FIFO_RD_PTR": self.i2c.read_byte_data(I2C_ADDRESS, FIFO_RD_PTR),
-            "FIFO_DATA": self.i2c.read_byte_data(I2C_ADDRESS, FIFO_DATA),
-            "MODE_CONFIG": self.i2c.read_byte_data(I2C_ADDRESS, MODE_CONFIG),
-            "SPO2_CONFIG": self.i2c.read_byte_data(I2C_ADDRESS, SPO2_CONFIG),
-            "LED_CONFIG": self.i2c.read_byte_data(I2C_ADDRESS, LED_CONFIG),
-            "TEMP_INTG": self.i2c.read_byte_data(I2C_ADDRESS, TEMP_INTG),
-            "TEMP_FRAC": self.i2c.read_byte_data(I2C_ADDRESS, TEMP_FRAC),
-            "REV_ID": self.i2c.read_byte_data(I2C_ADDRESS, REV_ID),
-            "PART_ID": self.i2c.read_byte_data(I2C_ADDRESS, PART_ID),
+            "INT_STATUS": int_status,
+            "INT_ENABLE": int_enable,
+            "FIFO_WR_PTR": write_ptr,
+            "OVRFLOW_CTR": overflow,
+            "FIFO_RD_PTR": read_ptr,
+            "FIFO_DATA": self._read_register(FIFO_DATA),  # Alone: a block read would pop whole samples
+            "MODE_CONFIG": mode,
+            "SPO2_CONFIG": spo2,
+            "LED_CONFIG": led,
+            "TEMP_INTG": temp_intg,
+            "TEMP_FRAC": temp_frac,
+            "REV_ID": rev_id,
+            "PART_ID": part_id,
         }
@@ -0,0 +1,168 @@
+"""
+  Lightweight latency metrics: fixed-bucket histograms per pipeline stage,
+  exported as Prometheus text to a file or a localhost HTTP endpoint.
+
+  Recording is a perf_counter() pair, a bisect and a few integer updates, so
+  it stays on in production; exporting is opt-in.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from sub-millisecond work up to multi-second alerts
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyHistogram(object):
+    """Counts per bucket plus sum, count and max; memory is fixed."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics(object):
+    """Named stage histograms, safe to record into from any thread."""
+
+    def __init__(self, prefix="drowsiness"):
+        self.prefix = prefix
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def to_prometheus(self):
+        name = self.prefix + "_stage_seconds"
+        lines = [
+            "# HELP %s Latency of each pipeline stage." % name,
+            "# TYPE %s histogram" % name,
+        ]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('%s_bucket{stage="%s",le="%s"} %d' % (name, stage, le, cumulative))
+                lines.append('%s_sum{stage="%s"} %.9f' % (name, stage, h.sum))
+                lines.append('%s_count{stage="%s"} %d' % (name, stage, h.count))
+            lines.append("# HELP %s_stage_max_seconds Slowest observation of each stage." % self.prefix)
+            lines.append("# TYPE %s_stage_max_seconds gauge" % self.prefix)
+            for stage, h in sorted(self.histograms.items()):
+                lines.append('%s_stage_max_seconds{stage="%s"} %.9f' % (self.prefix, stage, h.max))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # One line per stage: count, mean, p50/p99 bucket bound and max, in ms
+        with self._lock:
+            return "\n".join(
+                "%-20s n=%-7d mean=%.3f ms p50<=%.3f ms p99<=%.3f ms max=%.3f ms" % (
+                    stage, h.count, h.sum / h.count * 1000, h.quantile(0.5) * 1000,
+                    h.quantile(0.99) * 1000, h.max * 1000)
+                for stage, h in sorted(self.histograms.items()) if h.count)
+
+
+# Process-wide registry used by the pipeline modules
+registry = Metrics()
+observe = registry.observe
+timed = registry.timed
+
+
+class MetricsExporter(object):
+    """Publishes a registry every interval seconds to a file and/or serves it
+    at http://127.0.0.1:port/metrics."""
+
+    def __init__(self, metrics=registry, path=None, port=None, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        if self.port is not None:
+            metrics = self.metrics
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.to_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass  # Keep scrapes out of the terminal UI
+
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        if self.path is not None:
+            self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+            self._thread.start()
+
+    def write_file(self):
+        # Write-then-rename so readers never see a half-written file
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.metrics.to_prometheus())
+        os.replace(tmp, self.path)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+        if self.path is not None:
+            self.write_file()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write_file()
@@ -0,0 +1,169 @@
+"""
+  Adaptive MAX30100 power and sample-rate management, one manager per grip.
+
+  While the grip is held the sensor runs as configured (SpO2 mode, full rate).
+  When the hand leaves, it drops to presence detection: IR LED only, at a
+  lower sample rate and drained less often, which is all it takes to see the
+  hand come back. Below the hands-off speed nothing waits on that, so the
+  sensor is shut down and only woken for a short probe every probe_interval
+  seconds.
+"""
+
+import time
+
+import max30100
+
+FULL = "full"
+PRESENCE = "presence"
+STANDBY = "standby"
+MODES = (FULL, PRESENCE, STANDBY)
+
+# Config bits back to settings, for the LED current estimate
+_CURRENT_BY_BITS = {bits: current for current, bits in max30100.LED_CURRENT.items()}
+_RATE_BY_BITS = {bits: rate for rate, bits in max30100.SAMPLE_RATE.items()}
+_WIDTH_BY_BITS = {bits: width for width, bits in max30100.PULSE_WIDTH.items()}
+
+
+def led_current_ma(config):
+    """Average LED current in mA drawn with a save_config() configuration."""
+    mode = config[max30100.MODE_CONFIG]
+    if mode & 0x80:
+        return 0.0  # Shut down
+    spo2 = config[max30100.SPO2_CONFIG]
+    duty = _WIDTH_BY_BITS[spo2 & 0x03] * 1e-6 * _RATE_BY_BITS[(spo2 >> 2) & 0x07]
+    led = config[max30100.LED_CONFIG]
+    current = _CURRENT_BY_BITS[led & 0x0F]  # IR
+    if mode & 0x07 == max30100.MODE_SPO2:
+        current += _CURRENT_BY_BITS[led >> 4]  # Red only pulses in SpO2 mode
+    return current * duty
+
+
+class PowerManager(object):
+    """Switches one grip's sensor between FULL, PRESENCE and STANDBY.
+
+    Call update() once per UI tick with the grip's contact and whether
+    hands-off is being checked (i.e. the vehicle is above the hands-off
+    speed). The configuration found at construction is the FULL one. Time,
+    samples, I2C transactions, acquisition polls and LED charge are
+    accounted per mode for report().
+    """
+
+    def __init__(self, acquisition, presence_rate=50, presence_poll_interval=0.1,
+                 probe_interval=0.5, probe_time=0.15):
+        self.acquisition = acquisition
+        self.sensor = acquisition.sensor
+        self.presence_rate = presence_rate
+        self.presence_poll_interval = presence_poll_interval
+        self.probe_interval = probe_interval  # STANDBY: seconds between wakeups
+        self.probe_time = probe_time  # STANDBY: seconds awake per wakeup
+        self.full_config = self.sensor.save_config()
+        self.full_poll_interval = acquisition.poll_interval
+        self.mode = FULL
+        self.transitions = 0
+        self.bus_errors = 0  # Reconfigurations that failed on the bus and were retried
+        self._retry = False  # Last mode switch failed part-way
+        self._awake = True
+        self._next_switch = None  # STANDBY: when to wake up or go back to sleep
+        self._totals = {mode: dict.fromkeys(("seconds", "samples", "transactions", "polls", "led_mas"), 0.0) for mode in MODES}
+        self._last = None
+
+    def _counters(self):
+        return (self.sensor.sample_clock, self.sensor.transactions, self.acquisition.period_stats.count)
+
+    def _account(self, now):
+        counters = self._counters()
+        if self._last is not None:
+            then, (samples, transactions, polls) = self._last
+            totals = self._totals[self.mode]
+            totals["seconds"] += now - then
+            totals["samples"] += counters[0] - samples
+            totals["transactions"] += counters[1] - transactions
+            totals["polls"] += counters[2] - polls
+            totals["led_mas"] += (now - then) * led_current_ma(self.sensor.save_config())
+        self._last = (now, counters)
+
+    def update(self, contact, hands_off_checked, now=None):
+        now = time.perf_counter() if now is None else now
+        self._account(now)
+        mode = FULL if contact else PRESENCE if hands_off_checked else STANDBY
+        try:
+            with self.acquisition.lock:  # Keep the acquisition thread off the bus while reconfiguring
+                if mode != self.mode or self._retry:
+                    self._enter(mode, now)
+                elif mode == STANDBY and now >= self._next_switch:
+                    if self._awake:
+                        self.sensor.shutdown()
+                        self._next_switch = now + self.probe_interval
+                    else:
+                        self.sensor.set_mode(max30100.MODE_HR)  # Clears SHDN: probe for a hand
+                        self._next_switch = now + self.probe_time
+                    self._awake = not self._awake
+        except OSError:  # Includes BlockingIOError from a busy bus
+            # Mode and schedule only change once the writes went through; the sensor may
+            # be half-way, so the next update() enters its mode again (the shadow skips
+            # the writes that already landed)
+            self.bus_errors += 1
+            self._retry = True
+
+    def _enter(self, mode, now):
+        if mode == FULL:
+            # Drain what was sampled at the presence settings (timed at their rate), and again
+            # after the writes, so resume_index lands past every IR-only, low-rate sample
+            self.sensor.read_fifo()
+            self.sensor.restore_config(self.full_config)
+            self.sensor.read_fifo()
+            self.acquisition.set_low_power(False, self.full_poll_interval)
+        else:
+            # Flag the acquisition first, so no IR-only sample is used even if a write fails
+            self.acquisition.set_low_power(True, self.presence_poll_interval)
+            full_ir = _CURRENT_BY_BITS[self.full_config[max30100.LED_CONFIG] & 0x0F]
+            full_width = _WIDTH_BY_BITS[self.full_config[max30100.SPO2_CONFIG] & 0x03]
+            self.sensor.set_mode(max30100.MODE_HR)  # IR only
+            self.sensor.set_led_current(0, full_ir)  # Same IR current, so finger_threshold still holds
+            self.sensor.set_spo_config(self.presence_rate, full_width)
+            self._awake = True
+            if mode == STANDBY:
+                # Probe once right away, then sleep
+                self._next_switch = now + self.probe_time
+        if mode != self.mode:
+            self.transitions += 1
+        self.mode = mode
+        self._retry = False
+
+    def report(self):
+        """Per-mode time, rates and LED current, and the savings against running at FULL throughout."""
+        report = {}
+        for mode, totals in self._totals.items():
+            seconds = totals["seconds"]
+            report[mode] = {
+                "seconds": seconds,
+                "samples_per_s": totals["samples"] / seconds if seconds else 0.0,
+                "i2c_per_s": totals["transactions"] / seconds if seconds else 0.0,
+                "polls_per_s": totals["polls"] / seconds if seconds else 0.0,
+                "led_ma": totals["led_mas"] / seconds if seconds else 0.0,
+            }
+        total = sum(t["seconds"] for t in self._totals.values())
+        full = report[FULL]
+        if total and full["seconds"]:
+            # What the same time would have cost at the measured FULL rates
+            for key, name in (("samples", "samples_per_s"), ("transactions", "i2c_per_s"),
+                              ("polls", "polls_per_s"), ("led_mas", "led_ma")):
+                spent = sum(t[key] for t in self._totals.values())
+                baseline = full[name] * total
+                report["saved_" + key] = 1.0 - spent / baseline if baseline else 0.0
+        report["transitions"] = self.transitions
+        report["bus_errors"] = self.bus_errors
+        return report
+
+    def format_report(self):
+        r = self.report()
+        parts = ["%s %.0f s (%.0f samples/s, %.0f I2C/s, %.1f polls/s, LEDs %.2f mA)"
+                 % ((mode, r[mode]["seconds"], r[mode]["samples_per_s"], r[mode]["i2c_per_s"],
+                     r[mode]["polls_per_s"], r[mode]["led_ma"])) for mode in MODES if r[mode]["seconds"]]
+        line = "Power: " + ", ".join(parts)
+        if "saved_transactions" in r:
+            line += "; saved %.0f%% I2C, %.0f%% polls, %.0f%% LED charge vs. full rate" % (
+                100 * r["saved_transactions"], 100 * r["saved_polls"], 100 * r["saved_led_mas"])
+        if r["bus_errors"]:
+            line += "; %d bus errors (retried)" % r["bus_errors"]
+        return line
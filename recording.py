@@ -0,0 +1,168 @@
+"""
+  Recording of raw MAX30100 samples plus scenario inputs, and replay of those
+  recordings in place of the sensor.
+
+  File layout: MAGIC, a little-endian uint32 header length, a JSON header
+  (record dtype, sample rate), then fixed-size records back to back, so a
+  session can be memory-mapped and read in chunks without loading it whole.
+"""
+
+import json
+import struct
+import time
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+MAGIC = b"PPGREC1\n"
+
+# One sample with the scenario inputs that were current when it was processed
+RECORD_DTYPE = np.dtype([
+    ("index", "<i8"),
+    ("t", "<f8"),
+    ("ir", "<u2"),
+    ("red", "<u2"),
+    ("speed", "<f4"),
+    ("imu_x", "<f4"),
+    ("imu_y", "<f4"),
+    ("scenario", "<i1"),
+])
+
+
+class SessionRecorder(object):
+    """Appends samples to a session file through a fixed-size record buffer.
+
+    Records are staged in a preallocated array and written in one call per
+    block, so per-sample overhead is a few array stores and the disk write
+    cost is bounded by block_len.
+    """
+
+    def __init__(self, path, sample_rate=100, block_len=512):
+        self.path = path
+        self._buffer = np.zeros(block_len, dtype=RECORD_DTYPE)
+        self._fill = 0
+        self.records_written = 0
+        self._file = open(path, "wb")
+        header = json.dumps({"dtype": RECORD_DTYPE.descr, "sample_rate": sample_rate}).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(self, samples, speed=0.0, imu_x=0.0, imu_y=0.0, scenario=0):
+        # samples: array with index/t/ir/red fields, e.g. from MAX30100.read_fifo()
+        pos = 0
+        while pos < len(samples):
+            n = min(len(samples) - pos, len(self._buffer) - self._fill)
+            block = self._buffer[self._fill:self._fill + n]
+            chunk = samples[pos:pos + n]
+            for name in ("index", "t", "ir", "red"):
+                block[name] = chunk[name]
+            block["speed"] = speed
+            block["imu_x"] = imu_x
+            block["imu_y"] = imu_y
+            block["scenario"] = scenario or 0
+            self._fill += n
+            pos += n
+            if self._fill == len(self._buffer):
+                self.flush()
+
+    def flush(self):
+        if self._fill:
+            self._file.write(self._buffer[:self._fill].tobytes())
+            self.records_written += self._fill
+            self._fill = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_session(path):
+    """Return (header, records) with records memory-mapped read-only."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a PPG session recording" % path)
+        header_len, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+    dtype = np.dtype([tuple(field) for field in header["dtype"]])
+    offset = len(MAGIC) + 4 + header_len
+    records = np.memmap(path, dtype=dtype, mode="r", offset=offset)
+    return header, records
+
+
+class ReplaySensor(object):
+    """Stands in for max30100.MAX30100, serving samples from a recording.
+
+    With realtime=True, read_fifo() only returns samples whose recorded
+    timestamps have elapsed, like the real FIFO; otherwise each call returns
+    the next chunk_len samples immediately, for faster-than-real-time runs.
+    """
+
+    def __init__(self, path, realtime=False, chunk_len=16, max_buffer_len=10000):
+        header, self.records = load_session(path)
+        self.sample_rate = header["sample_rate"]
+        self.realtime = realtime
+        self.chunk_len = chunk_len
+        self.samples = RingBuffer(max_buffer_len, self.records.dtype)
+        self.sample_clock = int(self.records["index"][0]) if len(self.records) else 0
+        self.dropped_samples = 0
+        self._pos = 0
+        self._start = None
+
+    @property
+    def exhausted(self):
+        return self._pos >= len(self.records)
+
+    @property
+    def ir(self):
+        latest = self.samples.latest()
+        return int(latest["ir"]) if latest is not None else None
+
+    @property
+    def red(self):
+        latest = self.samples.latest()
+        return int(latest["red"]) if latest is not None else None
+
+    def inputs(self):
+        # Recorded (speed, imu_x, imu_y, scenario) at the latest replayed sample
+        latest = self.samples.latest()
+        if latest is None:
+            return None
+        return float(latest["speed"]), float(latest["imu_x"]), float(latest["imu_y"]), int(latest["scenario"])
+
+    def read_fifo(self):
+        if self.realtime:
+            if self._start is None:
+                self._start = time.perf_counter() - float(self.records["t"][self._pos] if not self.exhausted else 0.0)
+            due = time.perf_counter() - self._start
+            end = self._pos + int(np.searchsorted(self.records["t"][self._pos:], due, side="right"))
+        else:
+            end = min(self._pos + self.chunk_len, len(self.records))
+        chunk = np.array(self.records[self._pos:end])
+        self._pos = end
+        dropped = 0
+        if len(chunk):
+            # Gaps in the recorded index are samples the sensor lost on the ride
+            dropped = int(chunk["index"][0]) - self.sample_clock
+            self.dropped_samples += dropped
+            self.sample_clock = int(chunk["index"][-1]) + 1
+            self.samples.extend(chunk)
+        return chunk, dropped
+
+
+def replay_throughput(path, estimator):
+    """Run a recording through estimator.update() at max speed; returns samples per second."""
+    sensor = ReplaySensor(path, chunk_len=256)
+    start = time.perf_counter()
+    while not sensor.exhausted:
+        chunk, _ = sensor.read_fifo()
+        estimator.update(chunk["t"], chunk["ir"])
+    elapsed = time.perf_counter() - start
+    return len(sensor.records) / elapsed if elapsed else float("inf")
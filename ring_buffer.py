@@ -0,0 +1,76 @@
+"""
+  Fixed-capacity ring buffer backed by a preallocated NumPy array.
+
+  Shared by the MAX30100 driver (writer) and the heart-rate pipeline (reader)
+  so that keeping more history never costs more per sample.
+"""
+
+import numpy as np
+
+
+class RingBuffer(object):
+    """Sample history with O(1) append and zero-copy windows.
+
+    Every sample is stored twice, at slot i and slot i + capacity, so the
+    newest n samples are always one contiguous slice of the backing array and
+    window() can hand out a view instead of a copy.
+    """
+
+    def __init__(self, capacity, dtype=np.float64, shape=()):
+        # shape: per-sample shape, e.g. (2,) to keep two channels side by side
+        if capacity <= 0:
+            raise ValueError("capacity must be positive, got %s" % capacity)
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity,) + tuple(shape), dtype=dtype)
+        self._head = 0  # Next slot to write, always in [0, capacity)
+        self._count = 0
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def __len__(self):
+        return self._count
+
+    def append(self, sample):
+        self._data[self._head] = sample
+        self._data[self._head + self.capacity] = sample
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def extend(self, samples):
+        samples = np.asarray(samples, dtype=self._data.dtype)
+        n = len(samples)
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        # Split into the part that fits before the wrap and the part after it
+        first = min(n, self.capacity - self._head)
+        rest = n - first
+        start = self._head
+        self._data[start:start + first] = samples[:first]
+        self._data[start + self.capacity:start + self.capacity + first] = samples[:first]
+        if rest:
+            self._data[:rest] = samples[first:]
+            self._data[self.capacity:self.capacity + rest] = samples[first:]
+        self._head = (self._head + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def window(self, n=None):
+        """Return a read-only view of the newest n samples, oldest first."""
+        n = self._count if n is None else min(n, self._count)
+        end = self._head + self.capacity
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def latest(self):
+        if not self._count:
+            return None
+        return self._data[self._head - 1]
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
@@ -0,0 +1,80 @@
+"""
+  Synthetic PPG signals with known ground truth, shaped like MAX30100 output.
+
+  Used by the benchmarks and the fake I2C bus to exercise the heart-rate
+  pipeline away from the bike.
+"""
+
+import numpy as np
+
+# Generated sample: raw IR / red readings plus the true heart rate and contact state
+PPG_DTYPE = np.dtype([
+    ("t", np.float64),
+    ("ir", np.uint16),
+    ("red", np.uint16),
+    ("bpm", np.float32),
+    ("contact", np.bool_),
+])
+
+
+def generate_ppg(duration, fs=100, bpm=72.0, bpm_drift=0.0, hrv=0.02, spo2=97.0,
+                 ir_dc=20000.0, ir_ac=300.0, red_dc=15000.0, noise=20.0,
+                 motion_artifacts=0, finger_off=(), off_level=500.0, seed=None):
+    """Return a PPG_DTYPE array of duration seconds sampled at fs Hz.
+
+    bpm_drift is the heart-rate change in BPM per minute and hrv the relative
+    jitter of each inter-beat interval. motion_artifacts adds that many random
+    low-frequency bursts; finger_off is a sequence of (start, end) seconds where
+    the IR level drops to off_level as if the hand left the grip. spo2 sets the
+    red/IR modulation ratio with the usual 110 - 25 R calibration.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(round(duration * fs))
+    t = np.arange(n) / fs
+    true_bpm = bpm + bpm_drift * t / 60.0
+
+    # Beat onsets from the instantaneous rate, each interval jittered by hrv
+    beats = []
+    beat = 0.0
+    while beat < duration + 2.0:
+        beats.append(beat)
+        rate = bpm + bpm_drift * beat / 60.0
+        beat += 60.0 / rate * (1.0 + hrv * rng.standard_normal())
+    beats = np.asarray(beats)
+
+    # Pulse shape: systolic peak plus a smaller dicrotic wave, one per beat
+    idx = np.clip(np.searchsorted(beats, t, side="right") - 1, 0, len(beats) - 2)
+    period = beats[idx + 1] - beats[idx]
+    phase = (t - beats[idx]) / period
+    pulse = np.exp(-((phase - 0.2) / 0.08) ** 2) + 0.4 * np.exp(-((phase - 0.55) / 0.1) ** 2)
+    pulse -= pulse.mean()
+
+    # Blood volume raises absorption, so the reflected level dips on each beat
+    ratio = (110.0 - spo2) / 25.0
+    red_ac = ratio * red_dc * ir_ac / ir_dc
+    ir = ir_dc - ir_ac * pulse + 0.3 * ir_ac * np.sin(2 * np.pi * 0.25 * t)  # Breathing baseline
+    red = red_dc - red_ac * pulse + 0.3 * red_ac * np.sin(2 * np.pi * 0.25 * t)
+    ir += noise * rng.standard_normal(n)
+    red += noise * rng.standard_normal(n)
+
+    for _ in range(motion_artifacts):
+        center = rng.uniform(0, duration)
+        width = rng.uniform(0.5, 2.0)
+        burst = rng.uniform(3, 8) * ir_ac * np.exp(-((t - center) / width) ** 2) * np.sin(2 * np.pi * rng.uniform(0.3, 3.0) * t)
+        ir += burst
+        red += burst * red_dc / ir_dc
+
+    contact = np.ones(n, dtype=bool)
+    for start, end in finger_off:
+        off = (t >= start) & (t < end)
+        contact[off] = False
+        ir[off] = off_level + noise * rng.standard_normal(off.sum())
+        red[off] = off_level + noise * rng.standard_normal(off.sum())
+
+    out = np.empty(n, dtype=PPG_DTYPE)
+    out["t"] = t
+    out["ir"] = np.clip(ir, 0, 0xFFFF)
+    out["red"] = np.clip(red, 0, 0xFFFF)
+    out["bpm"] = true_bpm
+    out["contact"] = contact
+    return out